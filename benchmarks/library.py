@@ -0,0 +1,75 @@
+import heapq
+from itertools import accumulate
+import random
+import string
+
+GENRE_COUNT = 1500
+# Spotify libraries are dominated by a few artists; a Zipf-like weight per
+# catalog position reproduces that long tail.
+ZIPF_EXPONENT = 1.1
+
+
+def spotify_id(rng):
+    return ''.join(rng.choices(string.ascii_letters + string.digits, k=22))
+
+
+def zipf_weights(count):
+    return [1 / (rank ** ZIPF_EXPONENT) for rank in range(1, count + 1)]
+
+
+class Catalog:
+    # A shared pool of artists and tracks that every synthetic user samples
+    # from, so two libraries overlap the way real ones do.
+    def __init__(self, songs, seed=0):
+        self.rng = random.Random(seed)
+        genres = [F'genre {i}' for i in range(GENRE_COUNT)]
+        genre_cum_weights = list(accumulate(zipf_weights(GENRE_COUNT)))
+
+        self.artists = [{
+            'id': spotify_id(self.rng),
+            'name': F'artist {i}',
+            'images': [{'url': F'https://i.scdn.co/image/{i}', 'height': 640, 'width': 640}],
+            'genres': list(set(self.rng.choices(genres, cum_weights=genre_cum_weights,
+                                                k=self.rng.randint(0, 4)))),
+            'popularity': self.rng.randint(0, 100),
+            'type': 'artist',
+        } for i in range(max(songs // 8, 50))]
+        artist_weights = zipf_weights(len(self.artists))
+        artist_cum_weights = list(accumulate(artist_weights))
+
+        self.tracks = []
+        for i in range(songs * 3):
+            artists = self.rng.choices(self.artists, cum_weights=artist_cum_weights,
+                                       k=1 if self.rng.random() < 0.8 else 2)
+            self.tracks.append({
+                'id': spotify_id(self.rng),
+                'name': F'song {i}',
+                'artists': [{'id': artist['id'], 'name': artist['name'], 'type': 'artist'}
+                            for artist in artists],
+                'explicit': self.rng.random() < 0.2,
+                'duration_ms': self.rng.randint(90000, 400000),
+                'album': {'id': spotify_id(self.rng), 'name': F'album {i}', 'images': []},
+                'popularity': self.rng.randint(0, 100),
+            })
+        self.track_weights = zipf_weights(len(self.tracks))
+        self.artist_weights = artist_weights
+
+    def sample(self, items, weights, count, rng=None):
+        # Weighted sampling without replacement (Efraimidis-Spirakis keys).
+        rng = rng or self.rng
+        keyed = ((rng.random() ** (1 / weight), index)
+                 for index, weight in enumerate(weights))
+        return [items[index] for _, index in heapq.nlargest(count, keyed)]
+
+    def raw_library(self, songs, seed=None):
+        # A seed makes the library reproducible, e.g. one per user id.
+        rng = random.Random(seed) if seed is not None else self.rng
+        saved = self.sample(self.tracks, self.track_weights, songs, rng)
+        return {
+            'saved_songs': [{'added_at': '2019-11-%02dT12:00:00Z' % (i % 28 + 1), 'track': track}
+                            for i, track in enumerate(saved)],
+            'top_songs': saved[:50],
+            'top_artists': self.sample(self.artists, self.artist_weights, 50, rng),
+            'followed_artists': self.sample(self.artists, self.artist_weights,
+                                            min(max(songs // 20, 10), 1000), rng),
+        }
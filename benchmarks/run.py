@@ -0,0 +1,139 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from playlist.friend_requests import get_friend_list
+from playlist.intersection import (songs_in_common, artists_in_common, genres_in_common,
+                                   get_user_intersection)
+from playlist.listening_data import clean_song_data, clean_artist_data
+from playlist.models import Friendship
+from playlist.profile import build_profile
+from playlist.recommendations import get_seeds
+
+from .library import Catalog
+
+SIZES = (100, 1000, 10000, 100000)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class Fixture:
+    def __init__(self, size, seed=0):
+        catalog = Catalog(size, seed)
+        self.raw = catalog.raw_library(size)
+        self.user1 = self.user('user1', self.raw)
+        self.user2 = self.user('user2', catalog.raw_library(size))
+        # Requests read profiles built at sync time, so the set operations
+        # are measured against prebuilt ones and the build on its own.
+        self.profile1 = build_profile(self.user1['song_data'])
+        self.profile2 = build_profile(self.user2['song_data'])
+        self.intersection = get_user_intersection(self.user1, self.user2)
+        self.friends = type('FriendsOf', (), {'spotify_id': 'user1', 'friends': [
+            Friendship(status=('pending', 'requested', 'accepted')[i % 3],
+                       friend_id=F'friend{i}', name=F'friend {i}')
+            for i in range(max(size // 10, 10))]})()
+
+    @staticmethod
+    def user(spotify_id, raw):
+        return {'spotify_id': spotify_id, 'name': spotify_id, 'song_data': {
+            'saved_songs': [clean_song_data(item) for item in raw['saved_songs']],
+            'top_songs': [clean_song_data(track) for track in raw['top_songs']],
+            'top_artists': [clean_artist_data(artist) for artist in raw['top_artists']],
+            'followed_artists': [clean_artist_data(artist) for artist in raw['followed_artists']],
+        }}
+
+
+BENCHMARKS = {
+    'build_profile': lambda f: build_profile(f.user1['song_data']),
+    'songs_in_common': lambda f: songs_in_common(f.profile1, f.profile2),
+    'artists_in_common': lambda f: artists_in_common(f.profile1, f.profile2),
+    'genres_in_common': lambda f: genres_in_common(f.profile1, f.profile2),
+    'clean_song_data': lambda f: [clean_song_data(item) for item in f.raw['saved_songs']],
+    'clean_artist_data': lambda f: [clean_artist_data(artist)
+                                    for artist in f.raw['followed_artists']],
+    'get_friend_list': lambda f: get_friend_list(f.friends),
+    'get_seeds': lambda f: get_seeds(f.intersection),
+}
+
+
+def measure(benchmark, fixture, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        benchmark(fixture)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run so tracing overhead stays out of
+    # the timings.
+    tracemalloc.start()
+    benchmark(fixture)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'mean_s': statistics.mean(timings), 'min_s': min(timings),
+            'max_s': max(timings), 'peak_bytes': peak, 'repeat': repeat}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=SIZES, names=None, repeat=5, seed=0):
+    results = []
+    for size in sizes:
+        fixture = Fixture(size, seed)
+        for name in names or BENCHMARKS:
+            result = dict(function=name, size=size, **measure(BENCHMARKS[name], fixture, repeat))
+            print('{function:>20} {size:>7} songs  mean {mean_s:9.6f}s  min {min_s:9.6f}s  '
+                  'peak {peak_bytes:>11,} B'.format(**result))
+            results.append(result)
+    return {'created': datetime.utcnow().isoformat(), 'commit': git_commit(),
+            'python': platform.python_version(), 'seed': seed, 'results': results}
+
+
+def compare(baseline, current):
+    before = {(result['function'], result['size']): result for result in baseline['results']}
+    for result in current['results']:
+        previous = before.get((result['function'], result['size']))
+        if previous:
+            print('{:>20} {:>7} songs  time x{:.2f}  peak memory x{:.2f}'.format(
+                result['function'], result['size'],
+                result['mean_s'] / previous['mean_s'] if previous['mean_s'] else 0,
+                result['peak_bytes'] / previous['peak_bytes'] if previous['peak_bytes'] else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the data-processing hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--functions', nargs='+', choices=sorted(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.functions, args.repeat, args.seed)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, F"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as results_file:
+        json.dump(report, results_file, indent=2)
+    print(F'results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+from .server import create_app, DEFAULT_CONFIG
@@ -0,0 +1,18 @@
+import argparse
+import json
+
+from . import create_app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the Spotify Web API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--config', help='JSON file overriding fake_spotify.DEFAULT_CONFIG')
+    args = parser.parse_args()
+
+    config = None
+    if args.config:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+
+    create_app(config).run(host=args.host, port=args.port, threaded=True)
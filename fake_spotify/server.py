@@ -0,0 +1,257 @@
+from collections import deque
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+
+from flask import Flask, request, jsonify
+
+from benchmarks.library import Catalog
+
+DEFAULT_CONFIG = {
+    # Size of each synthetic user's saved library.
+    'songs': 1000,
+    # Seconds added to every response, per endpoint name or 'default'. A pair
+    # [low, high] picks a uniformly random delay.
+    'latency': {'default': 0},
+    # Fraction of requests answered with a random 5xx, per endpoint or 'default'.
+    'error_rate': {'default': 0},
+    # Requests per second across the whole server; 0 turns the limit off.
+    'rate_limit': 0,
+    'retry_after': 1,
+    # Largest `limit` honoured by paginated endpoints, per endpoint or 'default'.
+    'max_page_size': {'default': 50, 'playlist_tracks': 100},
+    'token_ttl': 3600,
+}
+
+FEATURE_NAMES = ('danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+                 'instrumentalness', 'liveness', 'valence', 'tempo')
+
+
+def user_seed(user_id):
+    return zlib.crc32(user_id.encode())
+
+
+def per_endpoint(setting, endpoint):
+    if isinstance(setting, dict):
+        return setting.get(endpoint, setting.get('default', 0))
+    return setting
+
+
+class FakeSpotify:
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.catalog = Catalog(self.config['songs'], seed=0)
+        self.tracks = {track['id']: track for track in self.catalog.tracks}
+        self.artists = {artist['id']: artist for artist in self.catalog.artists}
+        self.libraries = {}
+        self.tokens = {}
+        self.playlists = {}
+        self.recent_requests = deque()
+        self.lock = threading.Lock()
+
+    def library(self, user_id):
+        with self.lock:
+            if user_id not in self.libraries:
+                self.libraries[user_id] = self.catalog.raw_library(
+                    self.config['songs'], seed=user_seed(user_id))
+            return self.libraries[user_id]
+
+    def issue_token(self, user_id):
+        access_token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[access_token] = (user_id, time.time() + self.config['token_ttl'])
+        return access_token
+
+    def token_user(self, authorization):
+        token = (authorization or '').replace('Bearer ', '', 1)
+        with self.lock:
+            user_id, expires_at = self.tokens.get(token, (None, 0))
+        return user_id if expires_at > time.time() else None
+
+    def rate_limited(self):
+        limit = self.config['rate_limit']
+        if not limit:
+            return False
+        now = time.time()
+        with self.lock:
+            while self.recent_requests and self.recent_requests[0] < now - 1:
+                self.recent_requests.popleft()
+            if len(self.recent_requests) >= limit:
+                return True
+            self.recent_requests.append(now)
+        return False
+
+    def audio_features(self, track_id):
+        rng = random.Random(track_id)
+        features = {feature: rng.random() for feature in FEATURE_NAMES}
+        features.update(loudness=-rng.uniform(0, 30), tempo=rng.uniform(60, 200), id=track_id)
+        return features
+
+
+def error(status, message, headers=None):
+    return jsonify({'error': {'status': status, 'message': message}}), status, headers or {}
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    spotify = FakeSpotify(config)
+    app.config['FAKE_SPOTIFY'] = spotify
+
+    def page_limit():
+        cap = per_endpoint(spotify.config['max_page_size'], request.endpoint)
+        return min(int(request.args.get('limit', 20)), cap)
+
+    def offset_page(items):
+        offset = int(request.args.get('offset', 0))
+        limit = page_limit()
+        next_offset = offset + limit
+        next_url = None
+        if next_offset < len(items):
+            args = dict(request.args, offset=next_offset, limit=limit)
+            next_url = request.base_url + '?' + '&'.join(F'{k}={v}' for k, v in args.items())
+        return {'items': items[offset:next_offset], 'total': len(items), 'offset': offset,
+                'limit': limit, 'next': next_url}
+
+    @app.before_request
+    def inject_faults():
+        delay = per_endpoint(spotify.config['latency'], request.endpoint)
+        if isinstance(delay, (list, tuple)):
+            delay = random.uniform(*delay)
+        if delay:
+            time.sleep(delay)
+
+        if spotify.rate_limited():
+            return error(429, 'API rate limit exceeded',
+                         {'Retry-After': str(spotify.config['retry_after'])})
+        if random.random() < per_endpoint(spotify.config['error_rate'], request.endpoint):
+            status = random.choice((500, 502, 503))
+            return error(status, 'Injected failure')
+
+        if request.endpoint != 'token':
+            request.user_id = spotify.token_user(request.headers.get('Authorization'))
+            if not request.user_id:
+                return error(401, 'The access token expired')
+
+    @app.route('/api/token', methods=['POST'])
+    def token():
+        grant_type = request.form.get('grant_type')
+        if grant_type == 'authorization_code':
+            # Any code logs in as the user it names, e.g. code=user42.
+            user_id = request.form.get('code')
+        elif grant_type == 'refresh_token':
+            user_id = request.form.get('refresh_token', '').replace('refresh-', '', 1)
+        else:
+            return jsonify({'error': 'unsupported_grant_type'}), 400
+        if not user_id:
+            return jsonify({'error': 'invalid_grant'}), 400
+
+        response = {'access_token': spotify.issue_token(user_id), 'token_type': 'Bearer',
+                    'expires_in': spotify.config['token_ttl']}
+        if grant_type == 'authorization_code':
+            response['refresh_token'] = F'refresh-{user_id}'
+        return jsonify(response)
+
+    @app.route('/v1/me')
+    def me():
+        return jsonify({'id': request.user_id, 'display_name': F'User {request.user_id}',
+                        'images': []})
+
+    @app.route('/v1/me/tracks')
+    def saved_tracks():
+        return jsonify(offset_page(spotify.library(request.user_id)['saved_songs']))
+
+    @app.route('/v1/me/top/<kind>')
+    def top(kind):
+        if kind not in ('tracks', 'artists'):
+            return error(404, 'Not found')
+        library = spotify.library(request.user_id)
+        return jsonify(offset_page(library['top_songs' if kind == 'tracks' else 'top_artists']))
+
+    @app.route('/v1/me/following')
+    def following():
+        artists = spotify.library(request.user_id)['followed_artists']
+        limit = page_limit()
+        ids = [artist['id'] for artist in artists]
+        start = ids.index(request.args['after']) + 1 if request.args.get('after') in ids else 0
+        page = artists[start:start + limit]
+        next_url = None
+        if start + limit < len(artists):
+            next_url = (F"{request.base_url}?type=artist&limit={limit}"
+                        F"&after={page[-1]['id']}")
+        return jsonify({'artists': {'items': page, 'total': len(artists), 'limit': limit,
+                                    'next': next_url,
+                                    'cursors': {'after': page[-1]['id'] if page else None}}})
+
+    @app.route('/v1/recommendations')
+    def recommendations():
+        limit = min(int(request.args.get('limit', 20)), 100)
+        seeds = [seed for name in ('seed_tracks', 'seed_artists', 'seed_genres')
+                 for seed in request.args.get(name, '').split(',') if seed]
+        rng = random.Random(','.join(seeds))
+        tracks = rng.sample(spotify.catalog.tracks, min(limit, len(spotify.catalog.tracks)))
+        return jsonify({'tracks': tracks, 'seeds': [{'id': seed} for seed in seeds]})
+
+    @app.route('/v1/tracks')
+    def several_tracks():
+        ids = request.args.get('ids', '').split(',')[:50]
+        return jsonify({'tracks': [spotify.tracks.get(track_id) for track_id in ids]})
+
+    @app.route('/v1/artists')
+    def several_artists():
+        ids = request.args.get('ids', '').split(',')[:50]
+        return jsonify({'artists': [spotify.artists.get(artist_id) for artist_id in ids]})
+
+    @app.route('/v1/audio-features')
+    def audio_features():
+        ids = request.args.get('ids', '').split(',')[:100]
+        return jsonify({'audio_features': [spotify.audio_features(track_id) if
+                                           track_id in spotify.tracks else None
+                                           for track_id in ids]})
+
+    @app.route('/v1/users/<user_id>/playlists', methods=['POST'])
+    def create_playlist(user_id):
+        details = json.loads(request.get_data() or '{}')
+        playlist_id = uuid.uuid4().hex[:22]
+        with spotify.lock:
+            spotify.playlists[playlist_id] = {'id': playlist_id, 'owner': user_id,
+                                              'snapshot': 1, 'tracks': [], **details}
+        return jsonify({'id': playlist_id, 'snapshot_id': '1', **details}), 201
+
+    def find_playlist(playlist_id):
+        playlist = spotify.playlists.get(playlist_id)
+        if not playlist:
+            return None, error(404, 'Not found')
+        return playlist, None
+
+    @app.route('/v1/playlists/<playlist_id>', methods=['GET', 'PUT'])
+    def playlist_details(playlist_id):
+        playlist, not_found = find_playlist(playlist_id)
+        if not_found:
+            return not_found
+        if request.method == 'PUT':
+            with spotify.lock:
+                playlist.update(json.loads(request.get_data() or '{}'))
+                playlist['snapshot'] += 1
+            return '', 200
+        return jsonify({'id': playlist_id, 'name': playlist.get('name'),
+                        'snapshot_id': str(playlist['snapshot']),
+                        'tracks': {'total': len(playlist['tracks'])}})
+
+    @app.route('/v1/playlists/<playlist_id>/tracks', methods=['GET', 'POST'])
+    def playlist_tracks(playlist_id):
+        playlist, not_found = find_playlist(playlist_id)
+        if not_found:
+            return not_found
+        if request.method == 'POST':
+            uris = request.args.get('uris', '').split(',')
+            with spotify.lock:
+                playlist['tracks'] += [spotify.tracks[uri.split(':')[-1]] for uri in uris
+                                       if uri.split(':')[-1] in spotify.tracks]
+                playlist['snapshot'] += 1
+            return jsonify({'snapshot_id': str(playlist['snapshot'])}), 201
+        return jsonify(offset_page([{'track': track} for track in playlist['tracks']]))
+
+    return app
@@ -0,0 +1,20 @@
+import os
+import shutil
+import tempfile
+
+# Every worker records metrics into this directory so /metrics, served by
+# whichever worker gets the scrape, can report totals for all of them. It has
+# to be set before anything, this file included, imports prometheus_client:
+# the value class is chosen at import time and inherited by forked workers.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'playlist-metrics'))
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
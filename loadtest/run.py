@@ -0,0 +1,225 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import logging
+import math
+import os
+import statistics
+import threading
+import time
+
+import requests
+
+from benchmarks.run import git_commit
+
+SYNC_TIMEOUT = 60
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.samples[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, wall_seconds):
+        def summary(timings, errors):
+            ordered = sorted(timings)
+            return {
+                'count': len(ordered),
+                'errors': errors,
+                'error_rate': errors / len(ordered) if ordered else 0,
+                'throughput_rps': len(ordered) / wall_seconds if wall_seconds else 0,
+                'mean_ms': statistics.mean(ordered) * 1000 if ordered else None,
+                'p50_ms': percentile(ordered, 0.50) * 1000 if ordered else None,
+                'p95_ms': percentile(ordered, 0.95) * 1000 if ordered else None,
+                'p99_ms': percentile(ordered, 0.99) * 1000 if ordered else None,
+            }
+
+        routes = {route: summary(timings, self.errors[route])
+                  for route, timings in sorted(self.samples.items())}
+        total = summary([sample for timings in self.samples.values() for sample in timings],
+                        sum(self.errors.values()))
+        return routes, total
+
+
+class Session:
+    # One simulated app user, talking to the API over HTTP like the phone does.
+    def __init__(self, base_url, user_id, recorder):
+        self.base_url = base_url.rstrip('/')
+        self.user_id = user_id
+        self.recorder = recorder
+        self.http = requests.Session()
+
+    def call(self, method, path, route=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=120, **kwargs)
+        except requests.exceptions.RequestException:
+            self.recorder.record(route or F'{method} {path}', time.perf_counter() - start, False)
+            return None
+        self.recorder.record(route or F'{method} {path}', time.perf_counter() - start,
+                             response.status_code < 400)
+        return response
+
+    def login(self):
+        response = self.call('POST', '/login-user', data={'code': self.user_id})
+        if response is not None and response.ok:
+            self.http.headers['authorization'] = response.text
+
+    def wait_for_sync(self, timeout=SYNC_TIMEOUT):
+        # Login queues a sync job; the session carries on once it is done so
+        # later routes see a synced library. The wait is recorded as its own
+        # route, and a failed or timed out sync counts as a session error.
+        start = time.perf_counter()
+        deadline = time.time() + timeout
+        status = None
+        while time.time() < deadline:
+            response = self.call('GET', '/sync-status', params={'user_id': self.user_id})
+            status = response.json()['status'] if response is not None and response.ok else None
+            if status in ('done', 'failed'):
+                break
+            time.sleep(0.5)
+        self.recorder.record('sync', time.perf_counter() - start, status == 'done')
+        return status == 'done'
+
+
+def pair_session(base_url, user_id, friend_id, recorder):
+    user = Session(base_url, user_id, recorder)
+    friend = Session(base_url, friend_id, recorder)
+    pair = {'user_id': user_id, 'friend_id': friend_id}
+
+    user.login()
+    friend.login()
+    user.call('GET', '/me')
+    if not (user.wait_for_sync() and friend.wait_for_sync()):
+        return
+
+    user.call('GET', '/listening-history', params={'user_id': user_id})
+    user.call('POST', '/request-friend', data=pair)
+    friend.call('POST', '/accept-friend', data={'user_id': friend_id, 'friend_id': user_id})
+    user.call('GET', '/friends', params={'user_id': user_id})
+    user.call('GET', '/intersection', params=pair)
+    user.call('GET', '/recommendations', params=pair)
+
+    created = user.call('POST', '/playlist', params=pair)
+    if created is not None and created.ok:
+        uri = json.loads(json.loads(created.text))['uri']
+        playlist_id = uri.split(':')[-1]
+        user.call('PATCH', '/playlist', data={'playlist_uri': uri, 'friend_id': friend_id,
+                                              'name': 'Load test playlist'})
+        user.call('GET', '/playlists', params=pair)
+        user.call('GET', F'/playlist/{playlist_id}', route='GET /playlist/<playlist_id>')
+        user.call('DELETE', F'/playlist/{playlist_id}', route='DELETE /playlist/<playlist_id>')
+
+    user.call('POST', '/remove-friend', data=pair)
+
+
+def run(base_url, concurrency=4, iterations=3, app_user=None):
+    recorder = Recorder()
+    if app_user:
+        # Logging in as the playlist account stores the refresh token the
+        # app uses to create playlists.
+        Session(base_url, app_user, Recorder()).login()
+
+    def worker(index):
+        for _ in range(iterations):
+            pair_session(base_url, F'loadtest{index}a', F'loadtest{index}b', recorder)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    wall_seconds = time.perf_counter() - start
+
+    routes, total = recorder.report(wall_seconds)
+    # Every other route runs after the sync, so a run where none finished has
+    # measured nothing worth reporting.
+    sync = routes.get('sync')
+    if not sync or sync['errors'] == sync['count']:
+        raise RuntimeError('no session got past the sync; check the worker and the database')
+    return {'created': datetime.utcnow().isoformat(), 'commit': git_commit(),
+            'base_url': base_url, 'concurrency': concurrency, 'iterations': iterations,
+            'wall_s': wall_seconds, 'total': total, 'routes': routes}
+
+
+def serve_in_process(spotify_config=None):
+    # Runs fake_spotify, the app and a job worker in this process, each on its
+    # own thread, and returns the app's base URL.
+    from werkzeug.serving import make_server
+    from fake_spotify import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    spotify = make_server('127.0.0.1', 0, create_app(spotify_config), threaded=True)
+    threading.Thread(target=spotify.serve_forever, daemon=True).start()
+    spotify_url = F'http://127.0.0.1:{spotify.server_port}'
+    os.environ['SPOTIFY_API_URL'] = F'{spotify_url}/v1'
+    os.environ['SPOTIFY_ACCOUNTS_URL'] = F'{spotify_url}/api/token'
+    os.environ.setdefault('SPOTIFY_USER_ID', 'loadtest-app')
+    os.environ.setdefault('JWT_SECRET', 'loadtest-secret-' + '0' * 32)
+
+    from main import app
+    from playlist.jobs import run_worker
+
+    threading.Thread(target=run_worker, daemon=True).start()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return F'http://127.0.0.1:{server.server_port}'
+
+
+def print_report(report):
+    print(F"{'route':<34}{'count':>7}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}"
+          F"{'p99 ms':>10}{'req/s':>9}")
+    for route, stats in list(report['routes'].items()) + [('total', report['total'])]:
+        print(F"{route:<34}{stats['count']:>7}{stats['error_rate'] * 100:>8.1f}"
+              F"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+              F"{stats['throughput_rps']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the API through simulated user sessions.')
+    parser.add_argument('--url', help='base URL of a running app, e.g. under gunicorn; '
+                                      'without it the app runs in this process')
+    parser.add_argument('--spotify-config', help='JSON file for the in-process fake_spotify')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='sessions each concurrent pair of users runs')
+    parser.add_argument('--app-user', default=os.getenv('SPOTIFY_USER_ID'),
+                        help='spotify id of the account playlists are created with')
+    parser.add_argument('--output', help='where to write the JSON report')
+    args = parser.parse_args()
+
+    base_url = args.url
+    if not base_url:
+        spotify_config = None
+        if args.spotify_config:
+            with open(args.spotify_config) as config_file:
+                spotify_config = json.load(config_file)
+        base_url = serve_in_process(spotify_config)
+
+    report = run(base_url, args.concurrency, args.iterations,
+                 args.app_user or os.getenv('SPOTIFY_USER_ID'))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(F'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
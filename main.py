@@ -1,37 +1,77 @@
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import datetime
+import logging
 import os
 import json
+import time
 
-from flask import Flask, request
+from bson import json_util
+from flask import Flask, request, g
 import requests
 from dotenv import load_dotenv
 import jwt
 import mongoengine
 
-from playlist.models import User, Playlist
+from playlist.models import User, Job
+from playlist.catalog import expand_song_data
 from playlist.helpers import find_user_info
-from playlist.listening_data import load_user_data, get_user_genres
+from playlist.users import find_user, search_users, SEARCH_PAGE_SIZE
+from playlist.auth import decode_token, current_user_id, load_user
+from playlist.etags import make_etag, is_fresh, not_modified, with_etag
+from playlist.spotify_client import get_client
+from playlist.metrics import (MongoCommandListener, start_breakdown, observe_request,
+                              render as render_metrics)
+from playlist.rate_limit import RateLimitError
+from playlist.tokens import token_manager
+from playlist.listening_data import is_stale
+from playlist.profile import get_profile, TOP_GENRES
+from playlist.jobs import (enqueue_sync, enqueue_playlist, enqueue_pool_fill,
+                           pooled_recommendations, latest_job)
 from playlist.friend_requests import (send_friend_request, accept_friend_request,
                                       get_friend_list, remove_friend_from_database,
                                       )
 from playlist.intersection import get_user_intersection
+from playlist.pools import delete_pool
+from playlist.matches import find_suggested_matches, friend_intersections, MATCHES_PAGE_SIZE
 from playlist.recommendations import get_rec_from_intersection
-from playlist.playlists import (generate_playlist, get_tracks_from_id,
-                                set_playlist_details, delete_from_user_playlists)
+from playlist.playlists import (generate_playlist, save_playlist, get_tracks_from_id,
+                                get_user_playlists, set_playlist_details,
+                                delete_from_user_playlists, PLAYLISTS_PAGE_SIZE)
 
 app = Flask(__name__)
-mongoengine.connect('flaskapp', host=os.getenv('MONGODB_URI'))
+mongoengine.connect('flaskapp', host=os.getenv('MONGODB_URI'),
+                    event_listeners=[MongoCommandListener()])
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '1'))
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.monotonic()
+    g.breakdown = start_breakdown(request.endpoint)
+
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    seconds = time.monotonic() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(request.method, route, response.status_code, seconds)
+    if seconds > SLOW_REQUEST_SECONDS:
+        logger.warning('slow request: %s %s returned %s in %.3fs %s', request.method, route,
+                       response.status_code, seconds, json.dumps(g.breakdown.summary()))
+    return response
+
 
 def authorize_user(func):
     @wraps(func)
     def function_with_authorization(*args, **kws):
         encoded_jwt = request.headers.get("authorization")
         try:
-            jwt.decode(encoded_jwt, os.getenv(
-                'JWT_SECRET'), algorithm='HS256', audience="client")
+            g.claims = decode_token(encoded_jwt)
         except (jwt.InvalidTokenError, jwt.InvalidAudienceError, jwt.InvalidIssuedAtError):
             return ({"error": "You are not authorized to perform that action."}, 401)
         else:
@@ -39,25 +79,25 @@ def authorize_user(func):
     return function_with_authorization
 
 
-def confirm_user_identity(func):
-    @wraps(func)
-    def function_with_identification(*args, **kws):
-        user_id = request.args.get("user_id")
-        if not user_id:
-            user_id = request.form.get("user_id")
-        user = User.objects(spotify_id=user_id).first()
-        if not user:
-            return({"error": "Your token could not be verified"}, 401)
+def confirm_user_identity(*projections):
+    def decorator(func):
+        @wraps(func)
+        def function_with_identification(*args, **kws):
+            user_id = request.args.get("user_id")
+            if not user_id:
+                user_id = request.form.get("user_id")
 
-        encoded_jwt = request.headers.get("authorization")
-        decoded = jwt.decode(encoded_jwt, os.getenv(
-            'JWT_SECRET'), algorithm='HS256', audience="client")
+            if not user_id == current_user_id():
+                return ({"error": "You are not authorized to perform that action."}, 401)
 
-        if not user.spotify_id == decoded['id']:
-            return ({"error": "You are not authorized to perform that action."}, 401)
-        else:
-            return func(*args, **kws)
-    return function_with_identification
+            # Loads the user with the fields the handler will ask for, so the
+            # handler's own load_user call is served from the request context.
+            if not load_user(user_id, *projections):
+                return({"error": "Your token could not be verified"}, 401)
+            else:
+                return func(*args, **kws)
+        return function_with_identification
+    return decorator
 
 
 def check_for_request_errors(func):
@@ -71,6 +111,8 @@ def check_for_request_errors(func):
             return ({"error": F"There was a problem with your request: {conn_err}"}, 503)
         except requests.exceptions.Timeout as timeout_err:
             return ({"error": F"There was a problem with your request: {timeout_err}"}, 408)
+        except RateLimitError as rate_err:
+            return ({"error": F"There was a problem with your request: {rate_err}"}, 429)
         except requests.exceptions.RequestException as err:
             return ({"error": F"There was a problem with your request: {err}"}, 400)
         else:
@@ -109,6 +151,15 @@ def hello_flask():
     return "It's working!"
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('authorization') != F'Bearer {token}':
+        return ({"error": "You are not authorized to perform that action."}, 401)
+    body, content_type = render_metrics()
+    return (body, 200, {'Content-Type': content_type})
+
+
 @app.route('/coffee', methods=['GET'])
 def im_a_teapot():
     return ({"error": "I can't brew coffee because I'm a teapot!"}, 418)
@@ -125,19 +176,18 @@ def login_user():
         'grant_type': 'authorization_code'
     }
 
-    result = requests.post(
-        'https://accounts.spotify.com/api/token', data=params)
+    client = get_client()
+    result = client.request_token(params, raise_for_status=False, retry_errors=False)
     if result.status_code != 200:
         return (result.text, result.status_code)
     token = json.loads(result.text)['access_token']
 
-    user_info = requests.get('https://api.spotify.com/v1/me',
-                             headers={'Authorization': 'Bearer {}'.format(token)})
+    user_info = client.get('me', token=token, raise_for_status=False)
 
     if user_info.status_code != 200:
         return (user_info.text, user_info.status_code)
 
-    user = User.objects(spotify_id=json.loads(user_info.text)['id']).first()
+    user = find_user(json.loads(user_info.text)['id'], 'identity')
 
     if not user:
         user = User(
@@ -155,7 +205,10 @@ def login_user():
         user.sp_refresh_token = json.loads(result.text)['refresh_token']
         user.save()
 
-    load_user_data(user)
+    token_manager.remember(user.spotify_id, token,
+                           json.loads(result.text).get('expires_in', 3600))
+
+    enqueue_sync(user.spotify_id)
 
     encoded_jwt = jwt.encode({'id': user.spotify_id, 'iat': datetime.utcnow(), 'aud': 'client'},
                              os.getenv('JWT_SECRET'),
@@ -168,43 +221,66 @@ def login_user():
 @authorize_user
 @check_for_db_errors
 def get_logged_in_user_info():
-    encoded_jwt = request.headers.get("authorization")
-    decoded = jwt.decode(encoded_jwt, os.getenv(
-        'JWT_SECRET'), algorithm='HS256', audience="client")
-
-    return find_user_info(decoded['id'])
+    return find_user_info(current_user_id())
 
 
 @app.route('/listening-history', methods=['GET'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('versions')
 @check_for_request_errors
 @check_for_db_errors
 def get_listening_history():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'versions')
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
 
-    days_since_update = datetime.utcnow() - user.song_data.modified
+    if is_stale(user):
+        enqueue_sync(user_id)
 
-    if not user.song_data.modified or (days_since_update > timedelta(days=7)):
-        load_user_data(user)
+    etag = make_etag('listening-history', user_id, user.song_data.modified)
+    if is_fresh(etag):
+        return not_modified(etag)
 
-    return (user.song_data.to_json(), 200)
+    song_data = load_user(user_id, 'listening_data').song_data
+    response = song_data.to_mongo().to_dict()
+    response.update(expand_song_data(song_data))
+    return with_etag(json_util.dumps(response, json_options=json_util.LEGACY_JSON_OPTIONS), etag)
+
+
+@app.route('/sync-status', methods=['GET'])
+@authorize_user
+@confirm_user_identity('sync_state')
+@check_for_db_errors
+def get_sync_status():
+    user_id = request.args.get("user_id")
+    user = load_user(user_id, 'sync_state')
+
+    if not user:
+        return ({'error': F'could not find user with id {user_id}'}, 404)
+
+    job = latest_job('sync', user_id)
+    modified = user.song_data.modified
+
+    response = {
+        'status': job.status if job else None,
+        'error': job.error if job else None,
+        'last_synced': modified.isoformat() if modified else None,
+    }
+    return (json.dumps(response), 200)
 
 
 @app.route('/request-friend', methods=['POST'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('friends')
 @check_for_db_errors
 def request_friend():
     user_id = request.form.get("user_id")
     friend_id = request.form.get("friend_id")
 
-    user = User.objects(spotify_id=user_id).first()
-    requested = User.objects(spotify_id=friend_id).first()
+    user = load_user(user_id, 'friends')
+    requested = load_user(friend_id, 'friends')
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
@@ -219,25 +295,28 @@ def request_friend():
 
 @app.route('/accept-friend', methods=['POST'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('identity')
 @check_for_db_errors
 def accept_friend():
     user_id = request.form.get("user_id")
     friend_id = request.form.get("friend_id")
 
-    accept_friend_request(user_id, friend_id)
+    if not accept_friend_request(user_id, friend_id):
+        return (F"Could not find a friend request from user #{friend_id}.", 400)
+    enqueue_pool_fill(user_id, friend_id, replace=True)
     return (F"Successfully added user #{friend_id} as a friend.", 200)
 
 
 @app.route('/remove-friend', methods=['POST'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('identity')
 @check_for_db_errors
 def remove_friend():
     user_id = request.form.get("user_id")
     friend_id = request.form.get("friend_id")
 
     remove_friend_from_database(user_id, friend_id)
+    delete_pool(user_id, friend_id)
     return (F"Successfully removed user #{friend_id} from friends.", 200)
 
 
@@ -246,14 +325,32 @@ def remove_friend():
 @check_for_db_errors
 def get_friends():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'versions')
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
 
-    response = get_friend_list(user)
+    etag = make_etag('friends', user_id, user.friends_modified)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    response = get_friend_list(load_user(user_id, 'friends'))
+
+    return with_etag(json.dumps(response), etag)
+
+
+@app.route('/friends/intersections', methods=['GET'])
+@authorize_user
+@confirm_user_identity('friends', 'taste_profile')
+@check_for_db_errors
+def get_friend_intersections():
+    user_id = request.args.get("user_id")
+    user = load_user(user_id, 'friends', 'taste_profile')
+
+    if not user:
+        return ({'error': F'could not find user with id {user_id}'}, 404)
 
-    return(json.dumps(response), 200)
+    return(json.dumps(friend_intersections(user)), 200)
 
 
 @app.route('/user', methods=['GET'])
@@ -268,17 +365,39 @@ def get__user_info():
 @authorize_user
 @check_for_db_errors
 def all_users():
-    encoded_jwt = request.headers.get("authorization")
-    decoded = jwt.decode(encoded_jwt, os.getenv(
-        'JWT_SECRET'), algorithm='HS256', audience="client")
-
-    user_uid = decoded['id']
+    user_uid = current_user_id()
     app_uid = os.getenv('SPOTIFY_USER_ID')
 
-    response = User.objects(spotify_id__nin=[user_uid, app_uid]).only(
-        'name', 'spotify_id')
+    try:
+        limit = int(request.args.get('limit', SEARCH_PAGE_SIZE))
+        users, next_cursor = search_users(request.args.get('q'), [user_uid, app_uid],
+                                          limit, request.args.get('cursor'))
+    except ValueError as err:
+        return ({'error': str(err)}, 400)
+
+    response = [{'name': user.name, 'spotify_id': user.spotify_id} for user in users]
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+    return (json.dumps(response), 200, headers)
+
+
+@app.route('/suggested-matches', methods=['GET'])
+@authorize_user
+@confirm_user_identity('taste_profile')
+@check_for_db_errors
+def suggested_matches():
+    user_id = request.args.get("user_id")
+    user = load_user(user_id, 'taste_profile')
+
+    if not user:
+        return ({'error': F'could not find user with id {user_id}'}, 404)
 
-    return(response.to_json(), 200)
+    try:
+        limit = int(request.args.get('limit', MATCHES_PAGE_SIZE))
+    except ValueError as err:
+        return ({'error': str(err)}, 400)
+    matches = find_suggested_matches(user, limit)
+
+    return(json.dumps(matches), 200)
 
 
 @app.route('/genres', methods=['GET'])
@@ -286,14 +405,18 @@ def all_users():
 @check_for_db_errors
 def user_genres():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'versions')
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
 
-    genres = get_user_genres(user)
+    etag = make_etag('genres', user_id, user.song_data.modified)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    genres = get_profile(load_user(user_id, 'taste_profile')).genres[:TOP_GENRES]
 
-    return(json.dumps(dict(genres.most_common(20))), 200)
+    return with_etag(json.dumps(dict(genres)), etag)
 
 
 @app.route('/intersection', methods=['GET'])
@@ -302,63 +425,78 @@ def user_genres():
 @check_for_db_errors
 def find_intersection():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'versions')
     friend_id = request.args.get("friend_id")
-    friend = User.objects(spotify_id=friend_id).first()
+    friend = load_user(friend_id, 'versions')
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
     elif not friend:
         return ({'error': F'could not find user with id {friend_id}'}, 404)
 
-    if datetime.utcnow() - user.song_data.modified > timedelta(days=7):
-        load_user_data(user)
-    if datetime.utcnow() - friend.song_data.modified > timedelta(days=7):
-        load_user_data(friend)
-    intersection = get_user_intersection(user, friend)
-    return(json.dumps(intersection), 200)
+    if is_stale(user):
+        enqueue_sync(user_id)
+    if is_stale(friend):
+        enqueue_sync(friend_id)
+
+    etag = make_etag('intersection', user_id, user.song_data.modified,
+                     friend_id, friend.song_data.modified)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    intersection = get_user_intersection(load_user(user_id, 'taste_profile'),
+                                         load_user(friend_id, 'taste_profile'))
+    return with_etag(json.dumps(intersection), etag)
 
 
 @app.route('/recommendations', methods=['GET'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('taste_profile')
 @check_for_request_errors
 @check_for_db_errors
 def find_reccomendations():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'taste_profile')
     friend_id = request.args.get("friend_id")
-    friend = User.objects(spotify_id=friend_id).first()
+    friend = load_user(friend_id, 'taste_profile')
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
     elif not friend:
         return ({'error': F'could not find user with id {friend_id}'}, 404)
 
-    intersection = get_user_intersection(user, friend)
-    result = get_rec_from_intersection(intersection)
+    result = pooled_recommendations(user_id, friend_id, filter_explicit=False, consume=False)
+    if not result:
+        intersection = get_user_intersection(user, friend)
+        result = get_rec_from_intersection(intersection)
     return result
 
 
 @app.route('/playlists', methods=['GET'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('versions')
 @check_for_db_errors
 def get_playlists():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'versions')
     friend_id = request.args.get("friend_id")
 
     if not user:
         return ({'error': F'could not find user with id {user_id}'}, 404)
 
-    if friend_id:
-        playlists = [json.loads(playlist.to_json())
-                     for playlist in user.playlists if friend_id in playlist.owners]
-    else:
-        playlists = [json.loads(playlist.to_json())
-                     for playlist in user.playlists]
-    return (json.dumps(playlists), 200)
+    try:
+        offset = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', PLAYLISTS_PAGE_SIZE))
+    except ValueError as err:
+        return ({'error': str(err)}, 400)
+
+    etag = make_etag('playlists', user_id, user.playlists_modified, friend_id, offset, limit)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    playlists, next_offset = get_user_playlists(user_id, friend_id, offset, limit)
+    headers = {'X-Next-Cursor': str(next_offset)} if next_offset is not None else {}
+    return with_etag(json.dumps(playlists), etag, headers=headers)
 
 
 @app.route('/playlist/<playlist_id>', methods=['GET'])
@@ -371,14 +509,14 @@ def get_playlist_tracks(playlist_id):
 
 @app.route('/playlist', methods=['POST'])
 @authorize_user
-@confirm_user_identity
+@confirm_user_identity('taste_profile')
 @check_for_request_errors
 @check_for_db_errors
 def create_new_playlist():
     user_id = request.args.get("user_id")
-    user = User.objects(spotify_id=user_id).first()
+    user = load_user(user_id, 'taste_profile')
     friend_id = request.args.get("friend_id")
-    friend = User.objects(spotify_id=friend_id).first()
+    friend = load_user(friend_id, 'taste_profile')
 
     filter_explicit = request.args.get("filter_explicit")
 
@@ -392,37 +530,47 @@ def create_new_playlist():
     elif not friend:
         return ({'error': F'could not find user with id {friend_id}'}, 404)
 
+    if request.args.get("async"):
+        job = enqueue_playlist(user_id, friend_id, filter_explicit, seeds, features)
+        return (json.dumps({'job_id': str(job.id), 'status': job.status}), 202)
+
+    recommendations = None
+    if not seeds and not features:
+        recommendations = pooled_recommendations(user_id, friend_id, filter_explicit)
+
     playlist = generate_playlist(
-        user, friend, filter_explicit, seeds, features)
-
-    new_playlist = Playlist(
-        uri=playlist['uri'],
-        description=playlist['description'],
-        seeds=playlist['seeds'],
-        owners=[user_id, friend_id]
-    )
-
-    user.playlists.append(new_playlist)
-    friend.playlists.append(new_playlist)
-    print(new_playlist.seeds)
-    user.save()
-    friend.save()
-    if new_playlist in user.playlists and new_playlist in friend.playlists:
+        user, friend, filter_explicit, seeds, features, recommendations=recommendations)
+
+    new_playlist = save_playlist(playlist, user_id, friend_id)
+    if new_playlist:
         return (json.dumps(new_playlist.to_json()), 200)
     else:
         return (json.dumps({"error": "failed to save playlist"}), 400)
 
 
+@app.route('/playlist-jobs/<job_id>', methods=['GET'])
+@authorize_user
+@check_for_db_errors
+def get_playlist_job(job_id):
+    job = Job.objects(id=job_id, kind='playlist').first()
+    if not job or current_user_id() not in (job.user_id, job.payload.get('friend_id')):
+        return ({'error': F'could not find playlist job with id {job_id}'}, 404)
+
+    response = {
+        'status': job.status,
+        'result': job.result or None,
+        'error': job.error,
+        'stages': job.stages,
+    }
+    return (json.dumps(response), 200)
+
+
 @app.route('/playlist', methods=['PATCH'])
 @authorize_user
 @check_for_request_errors
 @check_for_db_errors
 def edit_playlist():
-    encoded_jwt = request.headers.get("authorization")
-    decoded = jwt.decode(encoded_jwt, os.getenv(
-        'JWT_SECRET'), algorithm='HS256', audience="client")
-
-    user_id = decoded['id']
+    user_id = current_user_id()
 
     playlist_uri = request.form.get("playlist_uri")
     if not playlist_uri:
@@ -448,11 +596,7 @@ def edit_playlist():
 @check_for_request_errors
 @check_for_db_errors
 def delete_playlist(playlist_id):
-    encoded_jwt = request.headers.get("authorization")
-    decoded = jwt.decode(encoded_jwt, os.getenv(
-        'JWT_SECRET'), algorithm='HS256', audience="client")
-
-    user_id = decoded['id']
+    user_id = current_user_id()
 
     if not playlist_id:
         return (json.dumps({'error': 'playlist_id is a required field'}), 400)
@@ -0,0 +1,13 @@
+import logging
+import os
+
+from dotenv import load_dotenv
+import mongoengine
+
+from playlist.migrations import migrate
+
+if __name__ == '__main__':
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    mongoengine.connect('flaskapp', host=os.getenv('MONGODB_URI'))
+    migrate()
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+from pymongo import UpdateOne
+
+from .helpers import get_access_token
+from .metrics import spotify_caller, in_current_context
+from .models import AudioFeatures
+from .spotify_client import get_client
+from .users import find_user
+
+FEATURE_NAMES = ('danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+                 'instrumentalness', 'liveness', 'valence', 'tempo')
+BATCH_SIZE = 100
+FETCH_WORKERS = 4
+
+
+def get_features(track):
+    features = {feature: track[feature] for feature in FEATURE_NAMES}
+    features['id'] = track['id']
+    return features
+
+
+def fetch_audio_features(track_ids, token):
+    response = get_client().get('audio-features', token=token,
+                                params={'ids': ','.join(track_ids)})
+    return [get_features(track) for track in response.json()['audio_features'] if track]
+
+
+def store_audio_features(features_list):
+    if not features_list:
+        return
+    AudioFeatures._get_collection().bulk_write([
+        UpdateOne({'_id': features['id']},
+                  {'$setOnInsert': {feature: features[feature] for feature in FEATURE_NAMES}},
+                  upsert=True)
+        for features in features_list], ordered=False)
+
+
+@spotify_caller
+def get_audio_features(track_ids):
+    track_ids = list(dict.fromkeys(track_ids))
+    features = {
+        stored.track_id: {feature: stored[feature] for feature in FEATURE_NAMES}
+        for stored in AudioFeatures.objects(track_id__in=track_ids)
+    }
+
+    missing = [track_id for track_id in track_ids if track_id not in features]
+    if missing:
+        token = get_access_token(os.getenv('SPOTIFY_USER_ID'))
+        batches = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(batches))) as executor:
+            fetched = [track for batch in executor.map(in_current_context(
+                lambda batch: fetch_audio_features(batch, token)), batches) for track in batch]
+        store_audio_features(fetched)
+        for track in fetched:
+            features[track['id']] = {feature: track[feature] for feature in FEATURE_NAMES}
+
+    return features
+
+
+def top_song_ids(user):
+    top_songs = find_user(user['spotify_id'], 'top_songs').song_data.top_songs
+    return [song['id'] for song in top_songs]
+
+
+def get_song_analysis_matrix(user):
+    song_ids = top_song_ids(user)
+    features = get_audio_features(song_ids)
+    rows = [[features[song_id][feature] for feature in FEATURE_NAMES]
+            for song_id in song_ids if song_id in features]
+    return np.array(rows, dtype=float).reshape(-1, len(FEATURE_NAMES))
+
+
+def get_feature_ranges(users, low=10, high=90):
+    matrix = np.vstack([get_song_analysis_matrix(user) for user in users])
+    if not len(matrix):
+        return {}
+
+    lows = np.percentile(matrix, low, axis=0)
+    highs = np.percentile(matrix, high, axis=0)
+    return {feature: {'min': float(lows[i]), 'max': float(highs[i])}
+            for i, feature in enumerate(FEATURE_NAMES)}
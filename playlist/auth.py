@@ -0,0 +1,43 @@
+import os
+import time
+
+from flask import g
+import jwt
+
+from .cache import LRUCache
+from .users import find_user, projections_cover
+
+verified_tokens = LRUCache(maxsize=4096, ttl=10 * 60)
+
+
+def decode_token(encoded_jwt):
+    claims = verified_tokens.get(encoded_jwt)
+    if claims is None:
+        claims = jwt.decode(encoded_jwt, os.getenv('JWT_SECRET'),
+                            algorithms=['HS256'], audience='client')
+        verified_tokens.set(encoded_jwt, claims)
+    elif 'exp' in claims and claims['exp'] < time.time():
+        verified_tokens.pop(encoded_jwt)
+        raise jwt.ExpiredSignatureError('Signature has expired')
+    return claims
+
+
+def current_user_id():
+    return g.claims['id']
+
+
+def load_user(user_id, *projections):
+    # Identity map for the current request: a user is fetched once with every
+    # projection asked for so far, and only re-fetched if a later caller needs
+    # fields that were not loaded.
+    loaded = g.setdefault('users', {})
+    if user_id in loaded:
+        user, loaded_projections = loaded[user_id]
+        if projections_cover(loaded_projections, projections):
+            return user
+        projections = tuple(set(projections) | loaded_projections)
+
+    user = find_user(user_id, *projections)
+    if user:
+        loaded[user_id] = (user, set(projections))
+    return user
@@ -0,0 +1,86 @@
+from pymongo import UpdateOne
+
+from .models import Track, Artist
+
+TRACK_FIELDS = ('name', 'artists', 'explicit')
+ARTIST_FIELDS = ('name', 'images', 'genres')
+
+TRACK_LISTS = ('saved_songs', 'top_songs')
+ARTIST_LISTS = ('top_artists', 'followed_artists')
+RANKED_LISTS = ('top_songs', 'top_artists')
+NAMED_DOCUMENTS = {'track': Track, 'artist': Artist}
+
+
+def is_expanded(entry):
+    return 'name' in entry
+
+
+def upsert(document, entries, fields):
+    operations = [UpdateOne({'_id': entry['id']},
+                            {'$set': {field: entry[field] for field in fields}},
+                            upsert=True)
+                  for entry in entries if is_expanded(entry)]
+    if operations:
+        document._get_collection().bulk_write(operations, ordered=False)
+
+
+def compact(entries, ranked=False):
+    references = []
+    for rank, entry in enumerate(entries):
+        reference = {'id': entry['id']}
+        if 'added_at' in entry:
+            reference['added_at'] = entry['added_at']
+        if ranked:
+            reference['rank'] = rank
+        references.append(reference)
+    return references
+
+
+def store_song_data(song_data):
+    tracks = [entry for data_type in TRACK_LISTS for entry in song_data[data_type]]
+    upsert(Track, tracks, TRACK_FIELDS)
+    # Artists only credited on a track still need a name for intersections.
+    upsert(Artist, [artist for track in tracks if is_expanded(track)
+                    for artist in track['artists']], ('name',))
+    upsert(Artist, [entry for data_type in ARTIST_LISTS for entry in song_data[data_type]],
+           ARTIST_FIELDS)
+    for data_type in TRACK_LISTS + ARTIST_LISTS:
+        song_data[data_type] = compact(song_data[data_type], data_type in RANKED_LISTS)
+
+
+def lookup(document, ids, fields):
+    if not ids:
+        return {}
+    cursor = document._get_collection().find({'_id': {'$in': list(ids)}},
+                                             {field: 1 for field in fields})
+    return {item.pop('_id'): item for item in cursor}
+
+
+def catalog_names(object_type, ids):
+    found = lookup(NAMED_DOCUMENTS[object_type], ids, ('name',))
+    return {item_id: item['name'] for item_id, item in found.items() if item.get('name')}
+
+
+def expand(entries, found):
+    expanded = []
+    for entry in entries:
+        if is_expanded(entry):
+            expanded.append(dict(entry))
+        elif entry['id'] in found:
+            expanded.append(dict(found[entry['id']], **entry))
+    return expanded
+
+
+def expand_song_data(song_data):
+    track_ids = {entry['id'] for data_type in TRACK_LISTS
+                 for entry in song_data[data_type] if not is_expanded(entry)}
+    artist_ids = {entry['id'] for data_type in ARTIST_LISTS
+                  for entry in song_data[data_type] if not is_expanded(entry)}
+    tracks = lookup(Track, track_ids, TRACK_FIELDS)
+    artists = lookup(Artist, artist_ids, ARTIST_FIELDS)
+
+    expanded = {data_type: expand(song_data[data_type], tracks) for data_type in TRACK_LISTS}
+    expanded.update({data_type: expand(song_data[data_type], artists)
+                     for data_type in ARTIST_LISTS})
+    expanded['modified'] = song_data['modified'] if 'modified' in song_data else None
+    return expanded
@@ -0,0 +1,19 @@
+import hashlib
+
+from flask import request
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def is_fresh(etag):
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    return ('', 304, {'ETag': F'"{etag}"'})
+
+
+def with_etag(body, etag, status=200, headers=None):
+    return (body, status, dict(headers or {}, ETag=F'"{etag}"'))
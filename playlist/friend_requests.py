@@ -1,5 +1,6 @@
+from datetime import datetime
+
 from .models import User, Friendship
-from mongoengine import Q
 
 
 def send_friend_request(user, requested):
@@ -21,6 +22,7 @@ def send_friend_request(user, requested):
         incoming_request
     )
 
+    user.friends_modified = requested.friends_modified = datetime.utcnow()
     user.save()
     requested.save()
     if outgoing_request in user.friends and incoming_request in requested.friends:
@@ -30,22 +32,33 @@ def send_friend_request(user, requested):
 
 
 def accept_friend_request(user_id, friend_id):
-    User.objects(Q(spotify_id=user_id) &
-                 Q(friends__friend_id=friend_id) &
-                 Q(friends__status='pending')).update_one(set__friends__S__status='accepted')
+    # Returns whether there was a pending request to accept. $elemMatch keeps
+    # both conditions, and so the positional update, on the same friendship.
+    now = datetime.utcnow()
+    accepted = User.objects(spotify_id=user_id,
+                            friends__match={'friend_id': friend_id, 'status': 'pending'}
+                            ).update_one(set__friends__S__status='accepted',
+                                         set__friends__S__modified=now,
+                                         set__friends_modified=now)
+    if not accepted:
+        return False
 
-    User.objects(Q(spotify_id=friend_id) &
-                 (Q(friends__friend_id=user_id) &
-                  Q(friends__status='requested'))).update_one(set__friends__S__status='accepted')
+    User.objects(spotify_id=friend_id,
+                 friends__match={'friend_id': user_id, 'status': 'requested'}
+                 ).update_one(set__friends__S__status='accepted',
+                              set__friends__S__modified=now,
+                              set__friends_modified=now)
+    return True
 
 
 def remove_friend_from_database(user_id, friend_id):
+    now = datetime.utcnow()
 
     User.objects(spotify_id=user_id).update_one(
-        pull__friends__friend_id=friend_id)
+        pull__friends__friend_id=friend_id, set__friends_modified=now)
 
     User.objects(spotify_id=friend_id).update_one(
-        pull__friends__friend_id=user_id)
+        pull__friends__friend_id=user_id, set__friends_modified=now)
 
 
 def get_friend_list(user):
@@ -1,33 +1,24 @@
+from contextlib import contextmanager
 import json
-import os
-import requests
+import time
 
+from .metrics import spotify_caller
+from .tokens import token_manager
+from .users import find_user
 
-from .models import User
 
+@spotify_caller
+def get_access_token(user_id):
+    return token_manager.get_token(user_id)
 
-def refresh_token(user_id):
-    user = User.objects(spotify_id=user_id).first()
-    params = {
-        'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
-        'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
-        "grant_type": 'refresh_token',
-        'refresh_token': user.sp_refresh_token
-    }
 
-    response = requests.post(
-        "https://accounts.spotify.com/api/token", data=params)
-    if response.status_code != 200:
-        response.raise_for_status()
-
-    user.sp_access_token = response.json()['access_token']
-    user.save()
-
-    return user.sp_access_token
+@spotify_caller
+def refresh_token(user_id, stale_token=None):
+    return token_manager.refresh(user_id, stale_token)
 
 
 def find_user_info(user_id):
-    user = User.objects(spotify_id=user_id).first()
+    user = find_user(user_id, 'profile')
     if user:
         response = {
             'name': user.name,
@@ -38,3 +29,15 @@ def find_user_info(user_id):
         return (json.dumps(response), 200)
     else:
         return ({'error': 'Could not locate user info'}, 404)
+
+
+@contextmanager
+def timed(stages, name):
+    # Records how long the block took under stages[name], in seconds. A None
+    # stages dict skips the bookkeeping for callers that don't want it.
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        if stages is not None:
+            stages[name] = round(time.monotonic() - start, 3)
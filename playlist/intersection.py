@@ -1,79 +1,56 @@
-from .listening_data import get_user_genres
+from .catalog import catalog_names
+from .models import User
+from .profile import get_profile, song_data_names
 
 
-def find_common_songs(user1, user2):
-    songs = {}
-    user1_songs = user1['song_data']['top_songs'] + \
-        user1['song_data']['saved_songs']
-    user2_songs = user2['song_data']['top_songs'] + \
-        user2['song_data']['saved_songs']
-
-    for song in user1_songs:
-        songs[song['id']] = song['name']
-    for song in user2_songs:
-        songs[song['id']] = song['name']
-
-    user1_songs = set([song['id'] for song in user1_songs])
-    user2_songs = set([song['id'] for song in user2_songs])
-
-    common_song_ids = user1_songs & user2_songs
+def item_names(user, object_type, ids):
+    # Stored profiles keep only ids, so names come from the shared catalog;
+    # plain dicts carry their full song data.
+    if isinstance(user, User):
+        return catalog_names(object_type, ids)
+    return song_data_names(user['song_data'])[object_type]
 
-    result = []
 
-    for song_id in common_song_ids:
-        result.append({'id': song_id, 'name': songs[song_id]})
+def named(ids, names):
+    return [{'id': item_id, 'name': names.get(item_id)} for item_id in ids]
 
-    return result
 
+def songs_in_common(profile1, profile2):
+    return set(profile1.song_ids) & set(profile2.song_ids)
 
-def find_common_artists(user1, user2):
-    artists = {}
-    user1_songs = user1['song_data']['top_songs'] + \
-        user1['song_data']['saved_songs']
-    user1_artists_from_songs = [
-        artist for song in user1_songs for artist in song['artists']]
-    user1_artists = user1['song_data']['top_artists'] + \
-        user1['song_data']['followed_artists']
-    user1_artists += user1_artists_from_songs
 
-    user2_songs = user2['song_data']['top_songs'] + \
-        user2['song_data']['saved_songs']
-    user2_artists_from_songs = [
-        artist for song in user2_songs for artist in song['artists']]
-    user2_artists = user2['song_data']['top_artists'] + \
-        user2['song_data']['followed_artists']
-    user2_artists += user2_artists_from_songs
+def artists_in_common(profile1, profile2):
+    return set(profile1.artist_ids) & set(profile2.artist_ids)
 
-    for artist in user1_artists:
-        artists[artist['id']] = artist['name']
-    for artist in user2_songs:
-        artists[artist['id']] = artist['name']
 
-    user1_artists = set([artist['id'] for artist in user1_artists])
-    user2_artists = set([artist['id'] for artist in user2_artists])
+def genres_in_common(profile1, profile2):
+    return list(set(profile1.top_genres) & set(profile2.top_genres))
 
-    common_artist_ids = user1_artists & user2_artists
 
-    result = []
+def find_common_songs(user1, user2):
+    common_song_ids = songs_in_common(get_profile(user1), get_profile(user2))
+    return named(common_song_ids, item_names(user1, 'track', common_song_ids))
 
-    for artist_id in common_artist_ids:
-        result.append({'id': artist_id, 'name': artists[artist_id]})
 
-    return result
+def find_common_artists(user1, user2):
+    common_artist_ids = artists_in_common(get_profile(user1), get_profile(user2))
+    return named(common_artist_ids, item_names(user1, 'artist', common_artist_ids))
 
 
 def find_common_genres(user1, user2):
-    user1_top_genres = set(dict(get_user_genres(user1).most_common(20)).keys())
-    user2_top_genres = set(dict(get_user_genres(user2).most_common(20)).keys())
-
-    return list(user1_top_genres & user2_top_genres)
+    return genres_in_common(get_profile(user1), get_profile(user2))
 
 
 def get_user_intersection(user1, user2):
+    profile1 = get_profile(user1)
+    profile2 = get_profile(user2)
+    common_song_ids = songs_in_common(profile1, profile2)
+    common_artist_ids = artists_in_common(profile1, profile2)
 
     intersection = {
-        'common_songs': find_common_songs(user1, user2),
-        'common_artists': find_common_artists(user1, user2),
-        'common_genres': find_common_genres(user1, user2)
+        'common_songs': named(common_song_ids, item_names(user1, 'track', common_song_ids)),
+        'common_artists': named(common_artist_ids,
+                                item_names(user1, 'artist', common_artist_ids)),
+        'common_genres': genres_in_common(profile1, profile2)
     }
     return intersection
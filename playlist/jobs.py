@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+import time
+
+from mongoengine.errors import NotUniqueError
+
+from .models import Job
+from .audio_features import get_audio_features
+from .helpers import timed
+from .metrics import caller, observe_job
+from .listening_data import load_user_data
+from .playlists import generate_playlist, save_playlist
+from .pools import fill_pool, draw_from_pool, pool_partners, pair_id, POOL_LOW_WATER
+from .users import find_user
+
+logger = logging.getLogger(__name__)
+
+JOB_TIMEOUT = timedelta(minutes=int(os.getenv('JOB_TIMEOUT_MINUTES', '15')))
+POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+
+
+def enqueue(kind, user_id, payload=None, key=None):
+    dedup_key = F'{kind}:{key or user_id}'
+    try:
+        return Job.objects(dedup_key=dedup_key).modify(
+            upsert=True, new=True,
+            set_on_insert__kind=kind,
+            set_on_insert__user_id=user_id,
+            set_on_insert__payload=payload or {},
+            set_on_insert__status='queued',
+            set_on_insert__created=datetime.utcnow())
+    except NotUniqueError:
+        # Lost an upsert race against another worker; its job is ours too.
+        return Job.objects(dedup_key=dedup_key).first()
+
+
+def enqueue_sync(user_id):
+    return enqueue('sync', user_id)
+
+
+def enqueue_pool_fill(user_id, friend_id, replace=False):
+    # Replacing fills dedupe among themselves only; folded into a queued or
+    # running top-up they would be dropped and the pool kept stale tracks.
+    key = pair_id(user_id, friend_id) + (':replace' if replace else '')
+    return enqueue('pool', user_id, {'friend_id': friend_id, 'replace': replace}, key=key)
+
+
+def enqueue_playlist(user_id, friend_id, filter_explicit, seeds=None, features=None):
+    # Each request asks for a new playlist, so these are never deduplicated.
+    return Job(kind='playlist', user_id=user_id, status='queued', payload={
+        'friend_id': friend_id,
+        'filter_explicit': filter_explicit,
+        'seeds': seeds,
+        'features': features,
+    }).save()
+
+
+def latest_job(kind, user_id):
+    return Job.objects(kind=kind, user_id=user_id).order_by('-created').first()
+
+
+def claim_job():
+    return Job.objects(status='queued').order_by('created').modify(
+        new=True, set__status='running', set__started=datetime.utcnow())
+
+
+def requeue_stale_jobs():
+    return Job.objects(status='running',
+                       started__lt=datetime.utcnow() - JOB_TIMEOUT).update(
+                           set__status='queued', unset__started=True)
+
+
+def run_sync_job(job):
+    user = find_user(job.user_id, 'sync')
+    if not user:
+        raise LookupError(F'could not find user with id {job.user_id}')
+    load_user_data(user)
+    # Warm the shared audio features store so playlist requests can derive
+    # feature ranges without calling Spotify.
+    get_audio_features([song['id'] for song in user.song_data.top_songs])
+    # New listening data changes what the pair has in common, so pools built
+    # from the old data are replaced.
+    for friend_id in pool_partners(job.user_id):
+        enqueue_pool_fill(job.user_id, friend_id, replace=True)
+
+
+def run_pool_job(job):
+    size = fill_pool(job.user_id, job.payload['friend_id'], job.payload.get('replace'))
+    return {'size': size}
+
+
+def pooled_recommendations(user_id, friend_id, filter_explicit, consume=True):
+    recommendations, remaining = draw_from_pool(user_id, friend_id, filter_explicit,
+                                                consume=consume)
+    if remaining is None or remaining < POOL_LOW_WATER:
+        enqueue_pool_fill(user_id, friend_id)
+    return recommendations
+
+
+def run_playlist_job(job):
+    payload = job.payload
+    with timed(job.stages, 'load_users'):
+        user = find_user(job.user_id, 'taste_profile')
+        friend = find_user(payload['friend_id'], 'taste_profile')
+    if not user:
+        raise LookupError(F'could not find user with id {job.user_id}')
+    if not friend:
+        raise LookupError(F"could not find user with id {payload['friend_id']}")
+
+    recommendations = None
+    if not payload.get('seeds') and not payload.get('features'):
+        with timed(job.stages, 'pool'):
+            recommendations = pooled_recommendations(job.user_id, payload['friend_id'],
+                                                     payload.get('filter_explicit'))
+
+    playlist = generate_playlist(user, friend, payload.get('filter_explicit'),
+                                 payload.get('seeds'), payload.get('features'),
+                                 stages=job.stages, recommendations=recommendations)
+
+    with timed(job.stages, 'save'):
+        new_playlist = save_playlist(playlist, job.user_id, payload['friend_id'])
+    if not new_playlist:
+        raise RuntimeError('failed to save playlist')
+    return json.loads(new_playlist.to_json())
+
+
+HANDLERS = {
+    'sync': run_sync_job,
+    'playlist': run_playlist_job,
+    'pool': run_pool_job,
+}
+
+
+def run_job(job):
+    job.stages = {}
+    start = time.monotonic()
+    try:
+        with caller(F'{job.kind}_job'):
+            result = HANDLERS[job.kind](job)
+    except Exception as err:
+        logger.exception('%s job for %s failed', job.kind, job.user_id)
+        observe_job(job.kind, 'failed', time.monotonic() - start)
+        Job.objects(id=job.id).update_one(
+            set__status='failed', set__error=str(err), set__stages=job.stages,
+            set__finished=datetime.utcnow(), unset__dedup_key=True)
+    else:
+        observe_job(job.kind, 'done', time.monotonic() - start)
+        Job.objects(id=job.id).update_one(
+            set__status='done', set__result=result or {}, set__stages=job.stages,
+            set__finished=datetime.utcnow(), unset__dedup_key=True)
+
+
+def run_worker(concurrency=None, stop_event=None):
+    concurrency = concurrency or int(os.getenv('JOB_CONCURRENCY', '4'))
+    stop_event = stop_event or threading.Event()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def run_and_release(job):
+        try:
+            run_job(job)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while not stop_event.is_set():
+            slots.acquire()
+            job = claim_job()
+            if not job:
+                slots.release()
+                requeue_stale_jobs()
+                stop_event.wait(POLL_INTERVAL)
+                continue
+            logger.info('running %s job for %s', job.kind, job.user_id)
+            executor.submit(run_and_release, job)
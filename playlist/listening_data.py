@@ -1,32 +1,78 @@
 from collections import Counter
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
 
+from .catalog import store_song_data, expand_song_data
 from .helpers import refresh_token
+from .metrics import spotify_caller, in_current_context
+from .names import remember_song_data
+from .profile import build_profile, get_profile
+from .spotify_client import get_client, SpotifyError
+
+PAGE_SIZE = 50
+PAGE_WORKERS = int(os.getenv('SPOTIFY_PAGE_WORKERS', '4'))
+
+ENDPOINTS = {
+    'saved_songs': 'me/tracks',
+    'top_songs': 'me/top/tracks',
+    'top_artists': 'me/top/artists',
+    'followed_artists': 'me/following?type=artist'
+}
+
+OFFSET_PAGINATED = ('saved_songs', 'top_songs', 'top_artists')
+
+RECONCILE_INTERVAL = timedelta(days=int(os.getenv('SAVED_SONGS_RECONCILE_DAYS', '30')))
+STALE_AFTER = timedelta(days=7)
+
+
+def fetch_page(user, url):
+    client = get_client()
+    response = client.get(url, token=user['sp_access_token'], raise_for_status=False)
+    if response.status_code == 401:
+        user['sp_access_token'] = refresh_token(
+            user['spotify_id'], stale_token=user['sp_access_token'])
+        response = client.get(url, token=user['sp_access_token'], raise_for_status=False)
+    if not response.ok:
+        raise SpotifyError(response)
+    return response.json()
+
+
+def get_offset_paginated_items(user, endpoint):
+    first_page = fetch_page(user, F'{endpoint}?offset=0&limit={PAGE_SIZE}')
+    items = first_page['items']
+    if not first_page.get('next'):
+        return items
+
+    # Offset endpoints report their total up front, so the remaining pages can
+    # be requested side by side instead of by following `next` links.
+    offsets = range(PAGE_SIZE, first_page['total'], PAGE_SIZE)
+    with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(offsets))) as executor:
+        pages = executor.map(in_current_context(
+            lambda offset: fetch_page(
+                user, F'{endpoint}?offset={offset}&limit={PAGE_SIZE}')['items']),
+            offsets)
+        for page in pages:
+            items += page
+    return items
+
+
+def get_cursor_paginated_items(user, endpoint):
+    items = []
+    url = F'{endpoint}&limit={PAGE_SIZE}'
+    while url:
+        page = fetch_page(user, url)['artists']
+        items += page['items']
+        url = page['next']
+    return items
 
 
+@spotify_caller
 def get_listening_data(user, data_type):
-    endpoints = {
-        'saved_songs': 'https://api.spotify.com/v1/me/tracks?offset=0&limit=50',
-        'top_songs': 'https://api.spotify.com/v1/me/top/tracks?offset=0&limit=50',
-        'top_artists': 'https://api.spotify.com/v1/me/top/artists?offset=0&limit=50',
-        'followed_artists': 'https://api.spotify.com/v1/me/following?type=artist&limit=50'
-    }
-
-    url = endpoints[data_type]
-    returned_list = []
-    access_token = user['sp_access_token']
-
-    while url:
-        response = requests.get(url, headers={
-            'Authorization': F'Bearer {access_token}'})
-        if response.status_code == 401:
-            refresh_token(user['spotify_id'])
-        elif data_type == 'followed_artists':
-            returned_list += response.json()['artists']['items']
-            url = response.json()['artists']['next']
-        else:
-            returned_list += response.json()['items']
-            url = response.json()['next']
+    if data_type in OFFSET_PAGINATED:
+        returned_list = get_offset_paginated_items(user, ENDPOINTS[data_type])
+    else:
+        returned_list = get_cursor_paginated_items(user, ENDPOINTS[data_type])
 
     if data_type == 'followed_artists' or data_type == 'top_artists':
         returned_list = [clean_artist_data(artist) for artist in returned_list]
@@ -36,13 +82,62 @@ def get_listening_data(user, data_type):
     return returned_list
 
 
+def needs_full_sync(song_data):
+    saved_songs = song_data['saved_songs']
+    reconciled = song_data['saved_songs_reconciled']
+    return (not saved_songs or 'added_at' not in saved_songs[0] or not reconciled
+            or datetime.utcnow() - reconciled > RECONCILE_INTERVAL)
+
+
+@spotify_caller
+def sync_saved_songs(user):
+    song_data = user['song_data']
+    if needs_full_sync(song_data):
+        saved_songs = get_listening_data(user, 'saved_songs')
+        song_data['saved_songs_reconciled'] = datetime.utcnow()
+        return saved_songs
+
+    # /me/tracks is ordered newest first, so everything after the first track
+    # we already hold was part of an earlier sync. Removals are only picked up
+    # by the periodic full reconcile above.
+    known_ids = {song['id'] for song in song_data['saved_songs']}
+    new_songs = []
+    url = F"{ENDPOINTS['saved_songs']}?offset=0&limit={PAGE_SIZE}"
+    while url:
+        page = fetch_page(user, url)
+        for item in page['items']:
+            if item['track']['id'] in known_ids:
+                return new_songs + list(song_data['saved_songs'])
+            new_songs.append(clean_song_data(item))
+        url = page['next']
+    return new_songs + list(song_data['saved_songs'])
+
+
+def is_stale(user):
+    modified = user['song_data']['modified']
+    return not modified or datetime.utcnow() - modified > STALE_AFTER
+
+
 def load_user_data(user):
-    user['song_data']['saved_songs'] = get_listening_data(user, 'saved_songs')
-    user['song_data']['top_songs'] = get_listening_data(user, 'top_songs')
-    user['song_data']['top_artists'] = get_listening_data(user, 'top_artists')
-    user['song_data'].followed_artists = get_listening_data(
-        user, 'followed_artists')
+    fetchers = {data_type: get_listening_data for data_type in ENDPOINTS}
+    fetchers['saved_songs'] = lambda user, data_type: sync_saved_songs(user)
+
+    with ThreadPoolExecutor(max_workers=len(ENDPOINTS)) as executor:
+        results = {data_type: executor.submit(in_current_context(fetch), user, data_type)
+                   for data_type, fetch in fetchers.items()}
+
+    song_data = user['song_data']
+    for data_type, result in results.items():
+        song_data[data_type] = result.result()
+    song_data['modified'] = datetime.utcnow()
+
+    # Track and artist details go to the shared catalog; the user keeps only
+    # references, which are expanded again to build the profile.
+    store_song_data(song_data)
+    full_song_data = expand_song_data(song_data)
+    user['taste_profile'] = build_profile(full_song_data)
     user.save()
+    remember_song_data(full_song_data)
 
 
 def clean_artist_data(artist):
@@ -55,6 +150,7 @@ def clean_artist_data(artist):
 
 
 def clean_song_data(track):
+    added_at = track.get('added_at')
     if 'track' in track:
         track = track['track']
     track = {
@@ -63,44 +159,11 @@ def clean_song_data(track):
         'artists': [{'id': artist['id'], 'name':artist['name']} for artist in track['artists']],
         'explicit': track['explicit']
     }
+    if added_at:
+        track['added_at'] = added_at
     return track
 
 
 def get_user_genres(user):
-    user_artists = user['song_data']['top_artists'] + \
-        user['song_data']['followed_artists']
-    user_genres = [
-        genre for artist in user_artists for genre in artist['genres']]
-    return Counter(user_genres)
-
-
-def get_features(track):
-    features = {
-        "danceability": track['danceability'],
-        "energy": track['energy'],
-        "loudness": track['loudness'],
-        "speechiness": track['speechiness'],
-        "acousticness": track['acousticness'],
-        "instrumentalness": track['instrumentalness'],
-        "liveness": track['liveness'],
-        "valence": track['valence'],
-        "tempo": track['tempo'],
-        "id": track['id']
-    }
-    return features
+    return Counter(dict(get_profile(user).genres))
 
-
-def get_song_analysis_matrix(user):
-    token = refresh_token(user.spotify_id)
-    song_ids = ','.join([song['id']
-                         for song in user['song_data']['top_songs']])
-
-    response = requests.get(F'https://api.spotify.com/v1/audio-features/?ids={song_ids}',
-                            headers={'Authorization': F'Bearer {token}'})
-
-    if response.status_code == 200:
-        song_analysis_matrix = [get_features(
-            track) for track in response.body['audio_features']]
-        return song_analysis_matrix
-    else:
-        response.raise_for_status()
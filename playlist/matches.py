@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+
+from .models import User
+from .intersection import get_user_intersection
+from .minhash import estimate_similarity, NUM_HASHES
+from .profile import get_profile
+from .users import find_user, find_users
+
+
+MATCHES_PAGE_SIZE = 20
+MAX_MATCHES = 50
+
+
+def find_suggested_matches(user, limit=MATCHES_PAGE_SIZE, exact_matches=5):
+    limit = max(1, min(limit, MAX_MATCHES))
+    profile = get_profile(user)
+    if not profile.song_ids and not profile.artist_ids:
+        return []
+
+    excluded = [user.spotify_id, os.getenv('SPOTIFY_USER_ID')]
+    candidates = User.objects(spotify_id__nin=excluded,
+                              taste_profile__lsh_bands__in=profile.lsh_bands).only(
+                                  'spotify_id', 'name', 'taste_profile.minhash')
+
+    signature = np.asarray(profile.minhash, dtype=np.uint64)
+    scored = sorted(((estimate_similarity(signature, candidate.taste_profile.minhash), candidate)
+                     for candidate in candidates
+                     if len(candidate.taste_profile.minhash) == NUM_HASHES),
+                    key=lambda match: match[0], reverse=True)[:limit]
+
+    matches = []
+    for rank, (similarity, candidate) in enumerate(scored):
+        match = {
+            'spotify_id': candidate.spotify_id,
+            'name': candidate.name,
+            'estimated_similarity': round(similarity, 3)
+        }
+        if rank < exact_matches:
+            intersection = get_user_intersection(
+                user, find_user(candidate.spotify_id, 'taste_profile'))
+            match.update({
+                'common_songs': len(intersection['common_songs']),
+                'common_artists': len(intersection['common_artists']),
+                'common_genres': intersection['common_genres']
+            })
+        matches.append(match)
+    return matches
+
+
+def count_common(own_ids, other_id_lists):
+    segments = np.repeat(np.arange(len(other_id_lists)),
+                         [len(ids) for ids in other_id_lists])
+    all_ids = np.array([item for ids in other_id_lists for item in ids], dtype=str)
+    in_common = np.isin(all_ids, np.array(list(own_ids), dtype=str))
+    return np.bincount(segments, weights=in_common,
+                       minlength=len(other_id_lists)).astype(int)
+
+
+def friend_intersections(user):
+    profile = get_profile(user)
+    friend_ids = [friend.friend_id for friend in user.friends if friend.status == 'accepted']
+    if not friend_ids:
+        return []
+
+    friends = []
+    friend_profiles = []
+    for friend in find_users(friend_ids, 'taste_profile'):
+        friends.append(friend)
+        friend_profiles.append(get_profile(friend))
+    if not friends:
+        return []
+
+    common_songs = count_common(profile.song_ids,
+                                [friend.song_ids for friend in friend_profiles])
+    common_artists = count_common(profile.artist_ids,
+                                  [friend.artist_ids for friend in friend_profiles])
+    common_genres = count_common(profile.top_genres,
+                                 [friend.top_genres for friend in friend_profiles])
+
+    own_size = len(profile.song_ids) + len(profile.artist_ids)
+    friend_sizes = np.array([len(friend.song_ids) + len(friend.artist_ids)
+                             for friend in friend_profiles])
+    shared = common_songs + common_artists
+    union = own_size + friend_sizes - shared
+    scores = np.divide(shared, union, out=np.zeros(len(friends)), where=union > 0)
+
+    results = [{
+        'friend_id': friend.spotify_id,
+        'name': friend.name,
+        'common_songs': int(common_songs[i]),
+        'common_artists': int(common_artists[i]),
+        'common_genres': int(common_genres[i]),
+        'score': round(float(scores[i]), 3)
+    } for i, friend in enumerate(friends)]
+    return sorted(results, key=lambda result: result['score'], reverse=True)
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+import contextvars
+from functools import wraps
+import os
+import re
+import threading
+from urllib.parse import urlparse
+
+from prometheus_client import (Histogram, CollectorRegistry, REGISTRY, generate_latest,
+                               CONTENT_TYPE_LATEST, multiprocess)
+from pymongo import monitoring
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Flask request latency by route',
+    ['method', 'route', 'status'])
+SPOTIFY_LATENCY = Histogram(
+    'spotify_request_duration_seconds', 'Spotify Web API call latency by endpoint and caller',
+    ['method', 'endpoint', 'status', 'caller'])
+MONGO_LATENCY = Histogram(
+    'mongo_command_duration_seconds', 'MongoDB command latency by command',
+    ['command', 'status'], buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+JOB_DURATION = Histogram(
+    'job_duration_seconds', 'Background job duration by kind',
+    ['kind', 'status'], buckets=(.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+# Path segments following these are ids and would explode label cardinality.
+ID_SEGMENTS = re.compile(r'\b(playlists|users)/[^/]+')
+
+_caller = contextvars.ContextVar('spotify_caller', default=None)
+_breakdown = contextvars.ContextVar('request_breakdown', default=None)
+
+
+class Breakdown:
+    # Counts and seconds spent in Spotify and Mongo during one request.
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds):
+        with self._lock:
+            count, total = self.totals.get(kind, (0, 0.0))
+            self.totals[kind] = (count + 1, total + seconds)
+
+    def summary(self):
+        return {kind: {'count': count, 'seconds': round(total, 4)}
+                for kind, (count, total) in sorted(self.totals.items())}
+
+
+def start_breakdown(default_caller=None):
+    # Called at the start of each request; gunicorn reuses threads, so both
+    # values are overwritten rather than inherited from the last request.
+    breakdown = Breakdown()
+    _breakdown.set(breakdown)
+    _caller.set(default_caller)
+    return breakdown
+
+
+def record_breakdown(kind, seconds):
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.add(kind, seconds)
+
+
+@contextmanager
+def caller(name):
+    token = _caller.set(name)
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def spotify_caller(func):
+    # Tags the Spotify calls made while func runs with its name.
+    @wraps(func)
+    def tagged(*args, **kwargs):
+        with caller(func.__name__):
+            return func(*args, **kwargs)
+    return tagged
+
+
+def current_caller():
+    return _caller.get() or 'unknown'
+
+
+def in_current_context(func):
+    # Executor threads start with an empty context; this carries the caller
+    # tag and request breakdown over to them.
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def spotify_endpoint(url):
+    parsed = urlparse(url)
+    if parsed.path.endswith('/api/token'):
+        return 'token'
+    path = parsed.path.split('/v1/', 1)[-1]
+    return ID_SEGMENTS.sub(r'\1/{id}', path)
+
+
+def observe_spotify(method, url, status, seconds):
+    SPOTIFY_LATENCY.labels(method, spotify_endpoint(url), str(status),
+                           current_caller()).observe(seconds)
+    record_breakdown(F'spotify:{current_caller()}', seconds)
+
+
+def observe_request(method, route, status, seconds):
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(seconds)
+
+
+def observe_job(kind, status, seconds):
+    JOB_DURATION.labels(kind, status).observe(seconds)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.observe(event, 'ok')
+
+    def failed(self, event):
+        self.observe(event, 'failed')
+
+    def observe(self, event, status):
+        seconds = event.duration_micros / 1e6
+        MONGO_LATENCY.labels(event.command_name, status).observe(seconds)
+        record_breakdown(F'mongo:{event.command_name}', seconds)
+
+
+def metrics_registry():
+    # Under gunicorn each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+    # and any worker can aggregate all of them.
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render():
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
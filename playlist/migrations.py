@@ -0,0 +1,137 @@
+import logging
+
+from mongoengine import Q
+from pymongo import UpdateOne
+
+from .minhash import NUM_HASHES
+from .models import User, Job, AudioFeatures, Track, Artist, RecommendationPool
+from .profile import get_profile
+from .users import backfill_normalized_names, find_user
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS = (User, Job, AudioFeatures, Track, Artist, RecommendationPool)
+
+# Representative shapes of the queries every request or job runs. The values
+# don't matter; only the plan the server picks for them does.
+HOT_QUERIES = {
+    'find_user': lambda: User.objects(spotify_id=''),
+    'find_users': lambda: User.objects(spotify_id__in=['', '']),
+    'friend_request_update': lambda: User.objects(
+        spotify_id='', friends__match={'friend_id': '', 'status': 'pending'}),
+    'friend_reverse_lookup': lambda: User.objects(friends__friend_id='',
+                                                  friends__status='accepted'),
+    'playlist_update': lambda: User.objects(Q(spotify_id='') & Q(playlists__uri='')),
+    'user_search': lambda: User.objects(name_normalized__startswith='').order_by(
+        'name_normalized', 'spotify_id'),
+    'lsh_candidates': lambda: User.objects(taste_profile__lsh_bands__in=['']),
+    'claim_job': lambda: Job.objects(status='queued').order_by('created'),
+    'latest_job': lambda: Job.objects(kind='sync', user_id='').order_by('-created'),
+    'user_pools': lambda: RecommendationPool.objects(user_ids=''),
+}
+
+
+def create_indexes(documents=DOCUMENTS):
+    report = []
+    for document in documents:
+        collection = document._get_collection()
+        existing = [info['key'] for info in collection.index_information().values()]
+        for spec in document._meta['index_specs']:
+            fields = [tuple(field) for field in spec['fields']]
+            if fields in [[tuple(key) for key in keys] for keys in existing]:
+                report.append((collection.name, fields, 'exists'))
+                continue
+            options = {key: value for key, value in spec.items() if key != 'fields'}
+            collection.create_index(fields, background=True, **options)
+            report.append((collection.name, fields, 'created'))
+    return report
+
+
+def plan_stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+def find_collection_scans(queries=HOT_QUERIES):
+    scans = []
+    for name, query in queries.items():
+        explained = query().explain()
+        if 'COLLSCAN' in plan_stages(explained['queryPlanner']['winningPlan']):
+            scans.append(name)
+    return scans
+
+
+SONG_DATA_LISTS = ('saved_songs', 'followed_artists', 'top_songs', 'top_artists')
+
+
+def clear_unsynced_modified():
+    # Users created while SongData.modified defaulted to the creation time
+    # look synced. Only those with no listening data never finished a sync;
+    # taste profiles are new, so the rest get theirs from get_profile.
+    unsynced = {F'song_data.{name}.0': {'$exists': False} for name in SONG_DATA_LISTS}
+    return User.objects(__raw__={
+        'taste_profile': None, 'song_data.modified': {'$ne': None}, **unsynced,
+    }).update(unset__song_data__modified=True)
+
+
+def rebuild_outdated_profiles():
+    # Profiles signed with a different number of hashes never match anyone's
+    # bands until rebuilt.
+    outdated = User.objects(__raw__={
+        'taste_profile': {'$ne': None},
+        'taste_profile.minhash': {'$not': {'$size': NUM_HASHES}}}).only('spotify_id')
+    rebuilt = 0
+    for user in outdated:
+        get_profile(find_user(user.spotify_id, 'taste_profile'))
+        rebuilt += 1
+    return rebuilt
+
+
+def drop_profile_names():
+    # Profiles used to carry an id -> name map of the whole library; names
+    # now come from the track and artist catalog.
+    return User._get_collection().update_many(
+        {'$or': [{'taste_profile.song_names': {'$exists': True}},
+                 {'taste_profile.artist_names': {'$exists': True}}]},
+        {'$unset': {'taste_profile.song_names': '', 'taste_profile.artist_names': ''}}
+    ).modified_count
+
+
+def backfill_credited_artists(batch_size=1000):
+    # Artists only credited on tracks were not in the artist catalog before
+    # intersections took names from it.
+    credited = Track._get_collection().aggregate([
+        {'$unwind': '$artists'},
+        {'$group': {'_id': '$artists.id', 'name': {'$first': '$artists.name'}}}])
+    artists = Artist._get_collection()
+    operations = []
+    added = 0
+    for artist in credited:
+        operations.append(UpdateOne({'_id': artist['_id']},
+                                    {'$setOnInsert': {'name': artist['name']}}, upsert=True))
+        if len(operations) == batch_size:
+            added += artists.bulk_write(operations, ordered=False).upserted_count
+            operations = []
+    if operations:
+        added += artists.bulk_write(operations, ordered=False).upserted_count
+    return added
+
+
+def migrate():
+    for collection, fields, outcome in create_indexes():
+        logger.info('%s index on %s: %s', collection, fields, outcome)
+
+    logger.info('backfilled normalized names for %d users', backfill_normalized_names())
+    logger.info('cleared sync time of %d never-synced users', clear_unsynced_modified())
+    logger.info('rebuilt %d outdated taste profiles', rebuild_outdated_profiles())
+    logger.info('dropped stored names from %d taste profiles', drop_profile_names())
+    logger.info('added %d track-credited artists to the catalog', backfill_credited_artists())
+
+    for name in find_collection_scans():
+        logger.warning('hot query %s falls back to a collection scan', name)
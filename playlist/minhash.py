@@ -0,0 +1,44 @@
+import zlib
+
+import numpy as np
+
+# Two users become candidates when all rows of any band agree, which for
+# Jaccard similarity J happens with probability 1 - (1 - J**ROWS) ** BANDS.
+# The curve turns at about (1 / BANDS) ** (1 / ROWS), here ~0.09: a pair with
+# J = 0.1 is found ~72% of the time and J = 0.2 almost always, while pairs
+# sharing only a few popular tracks (J ~ 0.01) rarely are.
+NUM_HASHES = 256
+BANDS = 128
+ROWS_PER_BAND = NUM_HASHES // BANDS
+CHUNK_SIZE = 4096
+
+# Universal hashing (a * x + b) mod p over 32-bit id hashes. With p < 2**32
+# every intermediate value fits in uint64.
+PRIME = np.uint64(4294967291)
+_coefficients = np.random.RandomState(2019).randint(1, int(PRIME), size=(2, NUM_HASHES),
+                                                    dtype=np.int64).astype(np.uint64)
+HASH_A, HASH_B = _coefficients[0][:, None], _coefficients[1][:, None]
+
+
+def profile_tokens(profile):
+    return ['song:' + song_id for song_id in profile.song_ids] + \
+        ['artist:' + artist_id for artist_id in profile.artist_ids]
+
+
+def minhash_signature(tokens):
+    signature = np.full(NUM_HASHES, PRIME, dtype=np.uint64)
+    for start in range(0, len(tokens), CHUNK_SIZE):
+        chunk = np.fromiter((zlib.crc32(token.encode()) for token in tokens[start:start + CHUNK_SIZE]),
+                            dtype=np.uint64)
+        hashed = (HASH_A * chunk[None, :] + HASH_B) % PRIME
+        signature = np.minimum(signature, hashed.min(axis=1))
+    return signature
+
+
+def lsh_bands(signature):
+    return [F'{band}:{zlib.crc32(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())}'
+            for band in range(BANDS)]
+
+
+def estimate_similarity(signature1, signature2):
+    return float(np.mean(np.asarray(signature1) == np.asarray(signature2)))
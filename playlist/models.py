@@ -1,6 +1,9 @@
 from datetime import datetime
+import unicodedata
+
 from mongoengine import (Document, EmbeddedDocument,
-                         DateTimeField, ListField, DictField, EmbeddedDocumentField, StringField)
+                         DateTimeField, ListField, DictField, EmbeddedDocumentField, StringField,
+                         IntField, FloatField, BooleanField)
 from mongoengine import signals
 
 
@@ -9,15 +12,32 @@ def update_modified(document):
 
 
 class SongData(EmbeddedDocument):
-    modified = DateTimeField(default=datetime.utcnow)
+    # Set by a successful sync only, so None means the library was never synced.
+    modified = DateTimeField()
     saved_songs = ListField(DictField())
     followed_artists = ListField(DictField())
     top_songs = ListField(DictField())
     top_artists = ListField(DictField())
+    saved_songs_reconciled = DateTimeField()
 
     signals.pre_save.connect(update_modified, sender='User')
 
 
+class TasteProfile(EmbeddedDocument):
+    # Mirrors song_data.modified at build time so a newer sync marks it stale.
+    modified = DateTimeField()
+    song_ids = ListField(StringField())
+    artist_ids = ListField(StringField())
+    genres = ListField(ListField())
+    top_genres = ListField(StringField())
+    minhash = ListField(IntField())
+    lsh_bands = ListField(StringField())
+
+    # Profiles saved before names moved to the catalog may still carry
+    # song_names and artist_names until migrate.py drops them.
+    meta = {'strict': False}
+
+
 class Friendship(EmbeddedDocument):
     status = StringField(required=True, choices=(
         "requested", "pending", "accepted"))
@@ -35,12 +55,98 @@ class Playlist(EmbeddedDocument):
     seeds = ListField(StringField())
 
 
+def normalize_name(name):
+    # Case- and accent-insensitive form of a display name, used for search.
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
 class User(Document):
     name = StringField(required=True)
-    spotify_id = StringField(required=True)
+    name_normalized = StringField()
+    spotify_id = StringField(required=True, unique=True)
     sp_access_token = StringField()
     sp_refresh_token = StringField()
     image_links = ListField(DictField())
     friends = ListField(EmbeddedDocumentField(Friendship))
     song_data = EmbeddedDocumentField(SongData, default=SongData)
+    taste_profile = EmbeddedDocumentField(TasteProfile)
+    friends_modified = DateTimeField()
+    playlists_modified = DateTimeField()
+
+    # Indexes are built by migrate.py rather than on first use in every worker.
+    meta = {'indexes': ['taste_profile.lsh_bands', ('name_normalized', 'spotify_id'),
+                        ('friends.friend_id', 'friends.status'), 'playlists.uri'],
+            'auto_create_index': False}
     playlists = ListField(EmbeddedDocumentField(Playlist))
+
+    def clean(self):
+        self.name_normalized = normalize_name(self.name)
+
+
+class Job(Document):
+    kind = StringField(required=True, choices=('sync', 'playlist', 'pool'))
+    user_id = StringField(required=True)
+    status = StringField(required=True, default='queued', choices=(
+        'queued', 'running', 'done', 'failed'))
+    # Set while the job is queued or running so a second enqueue for the same
+    # user finds this job instead of creating another one.
+    dedup_key = StringField(unique=True, sparse=True)
+    created = DateTimeField(default=datetime.utcnow)
+    started = DateTimeField()
+    finished = DateTimeField()
+    error = StringField()
+    payload = DictField()
+    result = DictField()
+    # Seconds spent in each named stage of the job, for spotting slow steps.
+    stages = DictField()
+
+    meta = {'indexes': [('status', 'created'), ('user_id', 'kind', '-created')],
+            'auto_create_index': False}
+
+
+class AudioFeatures(Document):
+    # Audio features of a track never change, so one copy serves every user.
+    track_id = StringField(primary_key=True)
+    danceability = FloatField()
+    energy = FloatField()
+    loudness = FloatField()
+    speechiness = FloatField()
+    acousticness = FloatField()
+    instrumentalness = FloatField()
+    liveness = FloatField()
+    valence = FloatField()
+    tempo = FloatField()
+
+    meta = {'collection': 'audio_features'}
+
+
+class Track(Document):
+    track_id = StringField(primary_key=True)
+    name = StringField()
+    artists = ListField(DictField())
+    explicit = BooleanField()
+
+    meta = {'collection': 'tracks'}
+
+
+class Artist(Document):
+    artist_id = StringField(primary_key=True)
+    name = StringField()
+    images = ListField(DictField())
+    genres = ListField(StringField())
+
+    meta = {'collection': 'artists'}
+
+
+class RecommendationPool(Document):
+    # Recommended tracks for a pair of friends, filled ahead of time so that
+    # generating a playlist doesn't wait on /recommendations.
+    pair_id = StringField(primary_key=True)
+    user_ids = ListField(StringField())
+    tracks = ListField(DictField())
+    modified = DateTimeField()
+
+    meta = {'collection': 'recommendation_pools', 'indexes': ['user_ids'],
+            'auto_create_index': False}
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from .cache import LRUCache
+from .catalog import catalog_names
+from .metrics import in_current_context
+from .spotify_client import get_client
+
+BATCH_SIZE = 50
+
+name_cache = LRUCache(maxsize=int(os.getenv('NAME_CACHE_SIZE', '50000')), ttl=24 * 60 * 60)
+
+
+def remember_names(items, object_type):
+    for item in items:
+        name_cache.set((object_type, item['id']), item['name'])
+
+
+def remember_song_data(song_data):
+    songs = song_data['top_songs'] + song_data['saved_songs']
+    remember_names(songs, 'track')
+    remember_names(song_data['top_artists'] + song_data['followed_artists'], 'artist')
+    remember_names([artist for song in songs for artist in song['artists']], 'artist')
+
+
+def fetch_names(object_ids, object_type, token):
+    response = get_client().get(F'{object_type}s', token=token,
+                                params={'ids': ','.join(object_ids)})
+    items = [item for item in response.json()[F'{object_type}s'] if item]
+    remember_names(items, object_type)
+    return {item['id']: item['name'] for item in items}
+
+
+def names_from_ids(ids_by_type, get_token):
+    names = {}
+    batches = []
+    for object_type, object_ids in ids_by_type.items():
+        missing = []
+        for object_id in object_ids:
+            name = name_cache.get((object_type, object_id))
+            if name is None:
+                missing.append(object_id)
+            else:
+                names[(object_type, object_id)] = name
+
+        # Syncs run in the worker, so this process's cache rarely holds a
+        # user's library; the shared catalog does.
+        if missing:
+            found = catalog_names(object_type, missing)
+            remember_names([{'id': object_id, 'name': name}
+                            for object_id, name in found.items()], object_type)
+            names.update(((object_type, object_id), name) for object_id, name in found.items())
+            missing = [object_id for object_id in missing if object_id not in found]
+
+        batches += [(object_type, missing[i:i + BATCH_SIZE])
+                    for i in range(0, len(missing), BATCH_SIZE)]
+
+    if not batches:
+        return names
+
+    token = get_token()
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        results = [(object_type, executor.submit(in_current_context(fetch_names),
+                                                   batch, object_type, token))
+                   for object_type, batch in batches]
+        for object_type, result in results:
+            for object_id, name in result.result().items():
+                names[(object_type, object_id)] = name
+    return names
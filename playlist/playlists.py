@@ -1,14 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 from datetime import datetime
 import json
-import requests
 from mongoengine import Q
 
-from .helpers import refresh_token
+from .cache import LRUCache
+from .helpers import get_access_token, timed
+from .metrics import spotify_caller, in_current_context
+from .listening_data import PAGE_WORKERS
+from .audio_features import get_feature_ranges
+from .spotify_client import get_client
 from .intersection import get_user_intersection
 
 from .recommendations import get_rec_from_intersection, get_rec_from_seeds
-from .models import User
+from .models import User, Playlist
+
+TRACKS_PAGE_SIZE = 100
+PLAYLISTS_PAGE_SIZE = 50
+MAX_PLAYLISTS_PAGE_SIZE = 100
+TRACK_FIELDS = 'items(track(name,id,artists(name)))'
+
+# Listings keyed by playlist id, stored with the snapshot_id they were read at.
+playlist_tracks_cache = LRUCache(maxsize=int(os.getenv('PLAYLIST_CACHE_SIZE', '1000')))
 
 
 def clean_playlist_track_data(track):
@@ -23,20 +36,29 @@ def clean_playlist_track_data(track):
     )
 
 
-def generate_playlist(user1, user2, filter_explicit, seeds=None, features=None, ):
+@spotify_caller
+def generate_playlist(user1, user2, filter_explicit, seeds=None, features=None, stages=None,
+                      recommendations=None):
     uid = os.getenv('SPOTIFY_USER_ID')
 
-    if not seeds and not features:
-        intersection = get_user_intersection(user1, user2)
-        recommendations = get_rec_from_intersection(
-            intersection, filter_explicit)
-    else:
-        recommendations = get_rec_from_seeds(seeds, features, filter_explicit)
+    # Callers pass recommendations already drawn from the pair's pool; only
+    # without them is /recommendations called live.
+    if recommendations is None:
+        with timed(stages, 'recommendations'):
+            if not seeds and not features:
+                intersection = get_user_intersection(user1, user2)
+                recommendations = get_rec_from_intersection(
+                    intersection, filter_explicit)
+            else:
+                if not features:
+                    features = get_feature_ranges([user1, user2])
+                recommendations = get_rec_from_seeds(seeds, features, filter_explicit)
 
     seed_names = recommendations['seeds']
     recommendation_list = recommendations['recommendations']
 
-    token = refresh_token(uid)
+    with timed(stages, 'token'):
+        token = get_access_token(uid)
 
     dt = datetime.now().strftime("%B %d, %Y %I:%M%p")
 
@@ -54,45 +76,95 @@ def generate_playlist(user1, user2, filter_explicit, seeds=None, features=None,
     if 'features' in recommendations:
         playlist_info['description'] += F", {', '.join(recommendations['features'])}"
 
-    create_playlist = requests.post(F'https://api.spotify.com/v1/users/{uid}/playlists',
-                                    headers={
-                                        'Authorization': F'Bearer {token}'},
-                                    data=json.dumps(playlist_info))
-
-    if create_playlist.status_code != 200:
-        create_playlist.raise_for_status()
+    client = get_client()
+    with timed(stages, 'create_playlist'):
+        create_playlist = client.post(F'users/{uid}/playlists', token=token,
+                                      data=json.dumps(playlist_info))
 
     pl_id = create_playlist.json()['id']
 
     tracks = ','.join(['spotify:track:{}'.format(track['id'])
                        for track in recommendation_list])
 
-    add_tracks = requests.post(F'https://api.spotify.com/v1/playlists/{pl_id}/tracks?uris={tracks}',
-                               headers={'Authorization': F'Bearer {token}'})
+    with timed(stages, 'add_tracks'):
+        client.post(F'playlists/{pl_id}/tracks?uris={tracks}', token=token)
+
+    return {'seeds': seed_names,
+            'uri': F'spotify:playlist:{pl_id}',
+            'description': playlist_info}
+
+
+def get_user_playlists(user_id, friend_id=None, offset=0, limit=PLAYLISTS_PAGE_SIZE):
+    # Playlists are appended as they are made, so a higher array position is
+    # a newer playlist.
+    limit = max(1, min(limit, MAX_PLAYLISTS_PAGE_SIZE))
+    pipeline = [
+        {'$match': {'spotify_id': user_id}},
+        {'$unwind': {'path': '$playlists', 'includeArrayIndex': 'position'}},
+    ]
+    if friend_id:
+        pipeline.append({'$match': {'playlists.owners': friend_id}})
+    pipeline += [
+        {'$sort': {'position': -1}},
+        {'$skip': max(offset, 0)},
+        {'$limit': limit + 1},
+        {'$replaceRoot': {'newRoot': '$playlists'}},
+    ]
+
+    # QuerySet.aggregate takes the stages as *args on the locked mongoengine,
+    # so the pipeline goes to the collection directly.
+    page = list(User._get_collection().aggregate(pipeline))
+    next_offset = offset + limit if len(page) > limit else None
+    return page[:limit], next_offset
+
+
+def save_playlist(playlist, user_id, friend_id):
+    new_playlist = Playlist(
+        uri=playlist['uri'],
+        description=playlist['description'],
+        seeds=playlist['seeds'],
+        owners=[user_id, friend_id]
+    )
+
+    now = datetime.utcnow()
+    saved = [User.objects(spotify_id=owner).update_one(push__playlists=new_playlist,
+                                                       set__playlists_modified=now)
+             for owner in (user_id, friend_id)]
+    return new_playlist if all(saved) else None
 
-    if add_tracks.status_code == 200 or add_tracks.status_code == 201:
-        return {'seeds': seed_names,
-                'uri': F'spotify:playlist:{pl_id}',
-                'description': playlist_info}
-    else:
-        add_tracks.raise_for_status()
 
+def get_tracks_page(playlist_id, offset, token):
+    response = get_client().get(F'playlists/{playlist_id}/tracks', token=token, params={
+        'offset': offset, 'limit': TRACKS_PAGE_SIZE, 'fields': TRACK_FIELDS})
+    return [clean_playlist_track_data(item) for item in response.json()['items']
+            if item.get('track')]
 
+
+@spotify_caller
 def get_tracks_from_id(playlist_id):
-    token = refresh_token(os.getenv('SPOTIFY_USER_ID'))
-    response = requests.get(F'https://api.spotify.com/v1/playlists/{playlist_id}/tracks',
-                            headers={'Authorization': F'Bearer {token}'})
-
-    if response.status_code == 200:
-        tracks = response.json()['items']
-        tracks = [clean_playlist_track_data(track) for track in tracks]
-        return tracks
-    else:
-        response.raise_for_status()
+    token = get_access_token(os.getenv('SPOTIFY_USER_ID'))
+    metadata = get_client().get(F'playlists/{playlist_id}', token=token, params={
+        'fields': 'snapshot_id,tracks.total'}).json()
+
+    cached = playlist_tracks_cache.get(playlist_id)
+    if cached and cached[0] == metadata['snapshot_id']:
+        return cached[1]
 
+    offsets = range(0, metadata['tracks']['total'], TRACKS_PAGE_SIZE)
+    tracks = []
+    if offsets:
+        with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(offsets))) as executor:
+            for page in executor.map(in_current_context(
+                    lambda offset: get_tracks_page(playlist_id, offset, token)), offsets):
+                tracks += page
 
+    playlist_tracks_cache.set(playlist_id, (metadata['snapshot_id'], tracks))
+    return tracks
+
+
+@spotify_caller
 def set_playlist_details(description, name, playlist_uri, user_id, friend_id):
-    token = refresh_token(os.getenv('SPOTIFY_USER_ID'))
+    token = get_access_token(os.getenv('SPOTIFY_USER_ID'))
     playlist_id = playlist_uri[17:]
 
     payload = {}
@@ -105,32 +177,33 @@ def set_playlist_details(description, name, playlist_uri, user_id, friend_id):
     else:
         return False
 
-    response = requests.put(F'https://api.spotify.com/v1/playlists/{playlist_id}',
-                            headers={'Authorization': F'Bearer {token}'},
-                            data=json.dumps(payload))
-
-    if response.status_code != 200:
-        response.raise_for_status()
+    get_client().put(F'playlists/{playlist_id}', token=token,
+                     data=json.dumps(payload))
     print(friend_id)
+    now = datetime.utcnow()
     if name:
         User.objects(Q(spotify_id=user_id) &
-                     Q(playlists__uri=playlist_uri)).update_one(set__playlists__S__description__name=name)
+                     Q(playlists__uri=playlist_uri)).update_one(set__playlists__S__description__name=name,
+                                                                set__playlists_modified=now)
         User.objects(Q(spotify_id=friend_id) &
-                     Q(playlists__uri=playlist_uri)).update_one(set__playlists__S__description__name=name)
+                     Q(playlists__uri=playlist_uri)).update_one(set__playlists__S__description__name=name,
+                                                                set__playlists_modified=now)
 
     if description:
         User.objects(Q(spotify_id=user_id) &
                      Q(playlists__uri=playlist_uri)).update_one(
-                         set__playlists__S__description__description=description)
+                         set__playlists__S__description__description=description,
+                         set__playlists_modified=now)
         User.objects(Q(spotify_id=friend_id) &
                      Q(playlists__uri=playlist_uri)).update_one(
-                         set__playlists__S__description__description=description)
+                         set__playlists__S__description__description=description,
+                         set__playlists_modified=now)
 
     return True
 
 
 def delete_from_user_playlists(user_id, playlist_uri):
     User.objects(spotify_id=user_id).update_one(
-        pull__playlists__uri=playlist_uri)
+        pull__playlists__uri=playlist_uri, set__playlists_modified=datetime.utcnow())
 
     return True
@@ -0,0 +1,100 @@
+from datetime import datetime
+import os
+import random
+
+from .intersection import get_user_intersection
+from .models import RecommendationPool
+from .recommendations import get_pool_recommendations
+from .users import find_user
+
+POOL_SIZE = int(os.getenv('RECOMMENDATION_POOL_SIZE', '200'))
+POOL_LOW_WATER = int(os.getenv('RECOMMENDATION_POOL_LOW_WATER', '60'))
+PLAYLIST_LENGTH = 20
+# Each request samples new seeds; stop after this many even if the pool is
+# still short, e.g. when a pair has very little in common.
+FILL_REQUESTS = 5
+
+
+def pair_id(user_id, friend_id):
+    return ':'.join(sorted((user_id, friend_id)))
+
+
+def pool_partners(user_id):
+    # Only current friends; a pool left over from an unfriended pair, e.g.
+    # refilled by a job queued before the removal, is never topped up again.
+    user = find_user(user_id, 'friends')
+    friend_ids = {friend.friend_id for friend in user.friends
+                  if friend.status == 'accepted'} if user else set()
+    partners = [next((member for member in pool.user_ids if member != user_id), user_id)
+                for pool in RecommendationPool.objects(user_ids=user_id).only('user_ids')]
+    return [partner for partner in partners if partner in friend_ids]
+
+
+def delete_pool(user_id, friend_id):
+    RecommendationPool.objects(pair_id=pair_id(user_id, friend_id)).delete()
+
+
+def fill_pool(user_id, friend_id, replace=False):
+    user = find_user(user_id, 'taste_profile')
+    friend = find_user(friend_id, 'taste_profile')
+    if not user:
+        raise LookupError(F'could not find user with id {user_id}')
+    if not friend:
+        raise LookupError(F'could not find user with id {friend_id}')
+
+    key = pair_id(user_id, friend_id)
+    pool = None if replace else RecommendationPool.objects(pair_id=key).only('tracks').first()
+    existing = pool.tracks if pool else []
+    seen = {track['id'] for track in existing}
+
+    intersection = get_user_intersection(user, friend)
+    tracks = []
+    for _ in range(FILL_REQUESTS):
+        if len(existing) + len(tracks) >= POOL_SIZE:
+            break
+        batch = get_pool_recommendations(intersection)
+        for track in batch['recommendations']:
+            if track['id'] not in seen:
+                seen.add(track['id'])
+                tracks.append(dict(track, seeds=batch['seeds']))
+
+    changes = {'set__user_ids': sorted((user_id, friend_id)),
+               'set__modified': datetime.utcnow()}
+    if replace:
+        changes['set__tracks'] = tracks
+    else:
+        changes['push_all__tracks'] = tracks
+    RecommendationPool.objects(pair_id=key).update_one(upsert=True, **changes)
+    return len(existing) + len(tracks)
+
+
+def draw_from_pool(user_id, friend_id, filter_explicit=False, count=PLAYLIST_LENGTH,
+                   consume=True):
+    # Returns the drawn recommendations, or None when the pool can't supply a
+    # full playlist, along with how many tracks the pool holds (None if the
+    # pair has no pool yet).
+    key = pair_id(user_id, friend_id)
+    pool = RecommendationPool.objects(pair_id=key).only('tracks').first()
+    if not pool:
+        return None, None
+
+    eligible = [track for track in pool.tracks
+                if not (filter_explicit and track.get('explicit'))]
+    if len(eligible) < count:
+        return None, len(pool.tracks)
+
+    drawn = random.sample(eligible, count)
+    if consume:
+        RecommendationPool.objects(pair_id=key).update_one(__raw__={
+            '$pull': {'tracks': {'id': {'$in': [track['id'] for track in drawn]}}}})
+
+    seed_names = []
+    for track in drawn:
+        seed_names += [seed for seed in track.get('seeds', []) if seed not in seed_names]
+
+    recommendations = {
+        'seeds': seed_names,
+        'recommendations': [{field: value for field, value in track.items() if field != 'seeds'}
+                            for track in drawn]
+    }
+    return recommendations, len(pool.tracks) - (count if consume else 0)
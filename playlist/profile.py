@@ -0,0 +1,58 @@
+from collections import Counter
+
+from .catalog import expand_song_data
+from .minhash import profile_tokens, minhash_signature, lsh_bands, NUM_HASHES
+from .models import User, TasteProfile
+from .users import find_user
+
+TOP_GENRES = 20
+
+
+def song_data_names(song_data):
+    songs = song_data['top_songs'] + song_data['saved_songs']
+    artists = song_data['top_artists'] + song_data['followed_artists']
+    artists_from_songs = [artist for song in songs for artist in song['artists']]
+    return {'track': {song['id']: song['name'] for song in songs},
+            'artist': {artist['id']: artist['name'] for artist in artists + artists_from_songs}}
+
+
+def build_profile(song_data):
+    # Only ids are kept; names for an intersection come from the catalog.
+    names = song_data_names(song_data)
+    artists = song_data['top_artists'] + song_data['followed_artists']
+    genres = Counter(genre for artist in artists for genre in artist['genres']).most_common()
+
+    profile = TasteProfile(
+        modified=song_data['modified'] if 'modified' in song_data else None,
+        song_ids=list(names['track']),
+        artist_ids=list(names['artist']),
+        genres=[[genre, count] for genre, count in genres],
+        top_genres=[genre for genre, _ in genres[:TOP_GENRES]]
+    )
+    signature = minhash_signature(profile_tokens(profile))
+    profile.minhash = signature.tolist()
+    profile.lsh_bands = lsh_bands(signature)
+    return profile
+
+
+def is_current(profile, song_data):
+    # Signatures from an earlier MinHash configuration can't be compared.
+    if not profile or not profile.modified or len(profile.minhash or ()) != NUM_HASHES:
+        return False
+    return song_data['modified'] is None or profile.modified >= song_data['modified']
+
+
+def get_profile(user):
+    if not isinstance(user, User):
+        return build_profile(user['song_data'])
+
+    if is_current(user.taste_profile, user.song_data):
+        return user.taste_profile
+
+    # Handlers usually load users with the taste_profile projection, which
+    # leaves the song_data lists behind, so rebuilds read them fresh.
+    song_data = find_user(user.spotify_id, 'listening_data').song_data
+    profile = build_profile(expand_song_data(song_data))
+    User.objects(spotify_id=user.spotify_id).update_one(set__taste_profile=profile)
+    user.taste_profile = profile
+    return profile
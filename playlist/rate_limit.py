@@ -0,0 +1,77 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+
+import requests
+
+
+class RateLimitError(requests.exceptions.RequestException):
+    pass
+
+
+class FileTokenBucket:
+    # Bucket state lives in a small locked file so every gunicorn worker on
+    # the dyno draws from, and backs off with, the same budget.
+    def __init__(self, path, rate, capacity):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+
+    def _update(self, change):
+        with open(self.path, 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                contents = state_file.read()
+                now = time.time()
+                state = json.loads(contents) if contents else {
+                    'tokens': self.capacity, 'updated': now, 'blocked_until': 0}
+                state['tokens'] = min(self.capacity,
+                                      state['tokens'] + (now - state['updated']) * self.rate)
+                state['updated'] = now
+
+                result = change(state, now)
+
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(json.dumps(state))
+                # Flush while still holding the lock, or the next holder can
+                # read the file before our buffered write reaches it.
+                state_file.flush()
+                return result
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+    def _take(self, state, now):
+        if state['blocked_until'] > now:
+            return state['blocked_until'] - now
+        if state['tokens'] >= 1:
+            state['tokens'] -= 1
+            return 0
+        return (1 - state['tokens']) / self.rate
+
+    def acquire(self, max_wait):
+        deadline = time.time() + max_wait
+        while True:
+            wait = self._update(self._take)
+            if not wait:
+                return
+            if time.time() + wait > deadline:
+                raise RateLimitError(
+                    F'Spotify rate limit reached, next request allowed in {wait:.1f}s')
+            time.sleep(wait)
+
+    def block_for(self, seconds):
+        def block(state, now):
+            state['blocked_until'] = max(state['blocked_until'], now + seconds)
+        self._update(block)
+
+
+def bucket_for_app():
+    client_id = os.getenv('SPOTIFY_CLIENT_ID') or 'default'
+    directory = os.getenv('SPOTIFY_RATE_LIMIT_DIR', tempfile.gettempdir())
+    return FileTokenBucket(os.path.join(directory, F'spotify-rate-limit-{client_id}.json'),
+                           rate=float(os.getenv('SPOTIFY_RATE_LIMIT', '10')),
+                           capacity=float(os.getenv('SPOTIFY_RATE_BURST', '20')))
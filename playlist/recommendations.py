@@ -1,12 +1,13 @@
 import os
 import random
 
-import requests
 
-
-from .helpers import refresh_token
+from .helpers import get_access_token
+from .metrics import spotify_caller
+from .spotify_client import get_client
 
 from .listening_data import clean_song_data
+from .names import names_from_ids, remember_names
 
 
 def get_seeds(intersection):
@@ -25,10 +26,7 @@ def get_seeds(intersection):
 def get_filtered_recommendations(url, token):
     tracks = []
 
-    response = requests.get(
-        F"{url}&limit=100", headers={'Authorization': F'Bearer {token}'})
-    if response.status_code != 200:
-        response.raise_for_status()
+    response = get_client().get(F"{url}&limit=100", token=token)
     tracks += [track for track in response.json()['tracks']
                if not track['explicit']]
 
@@ -45,22 +43,20 @@ def send_recommendation_request(request_url, token, filter_explicit):
     if filter_explicit:
         tracks = get_filtered_recommendations(request_url, token)
     else:
-        response = requests.get(request_url, headers={
-            'Authorization': F'Bearer {token}'})
-        if response.status_code != 200:
-            response.raise_for_status()
+        response = get_client().get(request_url, token=token)
         tracks = response.json()['tracks']
     return tracks
 
 
+@spotify_caller
 def get_rec_from_seeds(seeds, features, filter_explicit=False):
-    token = refresh_token(os.getenv('SPOTIFY_USER_ID'))
+    token = get_access_token(os.getenv('SPOTIFY_USER_ID'))
 
     seed_songs = ','.join(seeds['songs'])
     seed_artists = ','.join(seeds['artists'])
     seed_genres = ','.join(seeds['genres'])
 
-    request_url = 'https://api.spotify.com/v1/recommendations?'
+    request_url = 'recommendations?'
     request_url += F'seed_tracks={seed_songs}&seed_artists={seed_artists}&seed_genres={seed_genres}'
 
     feature_names = []
@@ -87,10 +83,7 @@ def get_rec_from_seeds(seeds, features, filter_explicit=False):
     return recommendations
 
 
-def get_rec_from_intersection(intersection, filter_explicit=False):
-    token = refresh_token(os.getenv('SPOTIFY_USER_ID'))
-    seeds = get_seeds(intersection)
-
+def intersection_request_url(seeds):
     seed_songs = ','.join([list(item.keys())[0]
                            for item in seeds if 'song' in item.values()])
     seed_artists = ','.join([list(item.keys())[0]
@@ -98,8 +91,19 @@ def get_rec_from_intersection(intersection, filter_explicit=False):
     seed_genres = ','.join([list(item.keys())[0]
                             for item in seeds if 'genre' in item.values()])
 
-    request_url = 'https://api.spotify.com/v1/recommendations?'
+    request_url = 'recommendations?'
     request_url += F'seed_tracks={seed_songs}&seed_artists={seed_artists}&seed_genres={seed_genres}'
+    return request_url
+
+
+@spotify_caller
+def get_rec_from_intersection(intersection, filter_explicit=False):
+    token = get_access_token(os.getenv('SPOTIFY_USER_ID'))
+    remember_names(intersection['common_songs'], 'track')
+    remember_names(intersection['common_artists'], 'artist')
+    seeds = get_seeds(intersection)
+
+    request_url = intersection_request_url(seeds)
 
     seed_names = get_seed_names(seeds, token)
 
@@ -112,30 +116,46 @@ def get_rec_from_intersection(intersection, filter_explicit=False):
     return recommendations
 
 
-def get_seed_names(seeds, token):
+@spotify_caller
+def get_pool_recommendations(intersection, limit=100):
+    # Unfiltered and as large as Spotify allows; explicit filtering happens
+    # when tracks are drawn from the pool.
+    token = get_access_token(os.getenv('SPOTIFY_USER_ID'))
+    remember_names(intersection['common_songs'], 'track')
+    remember_names(intersection['common_artists'], 'artist')
+    seeds = get_seeds(intersection)
+
+    response = get_client().get(F'{intersection_request_url(seeds)}&limit={limit}', token=token)
+
+    return {'seeds': get_seed_names(seeds, token),
+            'recommendations': [clean_song_data(track) for track in response.json()['tracks']]}
+
+
+@spotify_caller
+def get_seed_names(seeds, token=None):
+    seed_ids = {
+        'track': [list(seed.keys())[0] for seed in seeds if 'song' in seed.values()],
+        'artist': [list(seed.keys())[0] for seed in seeds if 'artist' in seed.values()]
+    }
+    names = names_from_ids(
+        seed_ids, lambda: token or get_access_token(os.getenv('SPOTIFY_USER_ID')))
+
     seed_names = []
 
     for seed in seeds:
+        seed_id = list(seed.keys())[0]
         if 'song' in seed.values():
-            song_id = list(seed.keys())[0]
-            song_name = name_from_id(song_id, 'track', token)
-            seed_names.append(F'{song_name} (song)')
+            seed_names.append(F"{names.get(('track', seed_id))} (song)")
         elif 'artist' in seed.values():
-            artist_id = list(seed.keys())[0]
-            artist_name = name_from_id(artist_id, 'artist', token)
-            seed_names.append(F'{artist_name} (artist)')
+            seed_names.append(F"{names.get(('artist', seed_id))} (artist)")
         else:
-            genre = list(seed.keys())[0]
-            seed_names.append(F'{genre} (genre)')
+            seed_names.append(F'{seed_id} (genre)')
     return seed_names
 
 
+@spotify_caller
 def name_from_id(object_id, object_type, token=None):
-    if not token:
-        token = refresh_token(os.getenv('SPOTIFY_USER_ID'))
-    response = requests.get(F'https://api.spotify.com/v1/{object_type}s/{object_id}',
-                            headers={'Authorization': F'Bearer {token}'})
-    if response.status_code != 200:
-        response.raise_for_status()
-    else:
-        return response.json()['name']
+    names = names_from_ids(
+        {object_type: [object_id]},
+        lambda: token or get_access_token(os.getenv('SPOTIFY_USER_ID')))
+    return names.get((object_type, object_id))
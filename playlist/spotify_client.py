@@ -0,0 +1,121 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import observe_spotify
+from .rate_limit import bucket_for_app, RateLimitError
+
+API_URL = 'https://api.spotify.com/v1'
+ACCOUNTS_URL = 'https://accounts.spotify.com/api/token'
+# A 5xx can arrive after Spotify applied the request, so only requests that
+# are safe to repeat are retried on one. A 429 was never applied and is
+# retried for every method.
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+
+
+class SpotifyError(requests.exceptions.HTTPError):
+    def __init__(self, response):
+        self.status_code = response.status_code
+        try:
+            message = response.json()['error']
+            if isinstance(message, dict):
+                message = message.get('message')
+        except (ValueError, KeyError, TypeError):
+            message = response.text
+        super().__init__(
+            F'{response.status_code} error from Spotify for {response.url}: {message}',
+            response=response)
+
+
+class SpotifyClient:
+    def __init__(self, pool_size=None, timeout=None, rate_limiter=None):
+        # Both URLs can point at a stand-in server, e.g. fake_spotify.
+        self.api_url = os.getenv('SPOTIFY_API_URL', API_URL).rstrip('/')
+        self.accounts_url = os.getenv('SPOTIFY_ACCOUNTS_URL', ACCOUNTS_URL)
+        self.pool_size = pool_size or int(os.getenv('SPOTIFY_POOL_SIZE', '20'))
+        self.timeout = timeout or float(os.getenv('SPOTIFY_TIMEOUT', '10'))
+        self.max_retries = int(os.getenv('SPOTIFY_MAX_RETRIES', '3'))
+        self.max_wait = float(os.getenv('SPOTIFY_MAX_WAIT', '30'))
+        self.rate_limiter = rate_limiter or bucket_for_app()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, token=None, raise_for_status=True, retry_errors=None,
+                **kwargs):
+        if retry_errors is None:
+            retry_errors = method in IDEMPOTENT_METHODS
+        if not url.startswith('http'):
+            url = F"{self.api_url}/{url.lstrip('/')}"
+
+        headers = kwargs.pop('headers', None) or {}
+        if token:
+            headers['Authorization'] = F'Bearer {token}'
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(self.max_wait)
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except requests.exceptions.RequestException:
+                observe_spotify(method, url, 'error', time.monotonic() - start)
+                raise
+            observe_spotify(method, url, response.status_code, time.monotonic() - start)
+
+            if response.status_code == 429:
+                retry_after = float(response.headers.get('Retry-After', 1))
+                self.rate_limiter.block_for(retry_after)
+                if retry_after > self.max_wait:
+                    raise RateLimitError(
+                        F'Spotify asked us to wait {retry_after:.0f}s before retrying',
+                        response=response)
+            elif response.status_code >= 500 and retry_errors and attempt < self.max_retries:
+                time.sleep(random.uniform(0, min(self.max_wait, 0.5 * 2 ** attempt)))
+            else:
+                break
+
+        if raise_for_status and not response.ok:
+            raise SpotifyError(response)
+        return response
+
+    def get(self, url, token=None, **kwargs):
+        return self.request('GET', url, token, **kwargs)
+
+    def post(self, url, token=None, **kwargs):
+        return self.request('POST', url, token, **kwargs)
+
+    def put(self, url, token=None, **kwargs):
+        return self.request('PUT', url, token, **kwargs)
+
+    def request_token(self, params, raise_for_status=True, retry_errors=None):
+        # A refresh can be repeated safely; an authorization code is single use.
+        if retry_errors is None:
+            retry_errors = params.get('grant_type') == 'refresh_token'
+        return self.request('POST', self.accounts_url, data=params,
+                            raise_for_status=raise_for_status, retry_errors=retry_errors)
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # gunicorn forks workers after import, so each process builds its own
+    # session instead of sharing pooled sockets with its parent.
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = SpotifyClient()
+                _client_pid = pid
+    return _client
@@ -0,0 +1,66 @@
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+from playlist import audio_features
+
+
+def features_for(track_id):
+    features = {feature: 0.5 for feature in audio_features.FEATURE_NAMES}
+    features['id'] = track_id
+    return features
+
+
+class TestAudioFeatures(TestCase):
+    def setUp(self):
+        self.patchers = [
+            patch('playlist.audio_features.AudioFeatures'),
+            patch('playlist.audio_features.get_access_token', return_value='token'),
+            patch('playlist.audio_features.store_audio_features'),
+            patch('playlist.audio_features.get_client'),
+        ]
+        self.mock_stored, _, self.mock_store, mock_client = [
+            patcher.start() for patcher in self.patchers]
+        self.mock_get = mock_client.return_value.get
+
+        def several(url, token=None, params=None):
+            response = Mock()
+            response.json.return_value = {'audio_features': [
+                features_for(track_id) for track_id in params['ids'].split(',')]}
+            return response
+        self.mock_get.side_effect = several
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_missing_features_are_fetched_in_batches_of_100(self):
+        self.mock_stored.objects.return_value = []
+        track_ids = [F'track{i}' for i in range(250)]
+
+        features = audio_features.get_audio_features(track_ids)
+
+        self.assertEqual(self.mock_get.call_count, 3)
+        for call in self.mock_get.call_args_list:
+            self.assertLessEqual(len(call[1]['params']['ids'].split(',')), 100)
+        self.assertEqual(len(features), 250)
+        self.assertEqual(len(self.mock_store.call_args[0][0]), 250)
+
+    def test_stored_features_need_no_request(self):
+        stored = Mock(track_id='track1')
+        stored.__getitem__ = lambda self, feature: 0.25
+        self.mock_stored.objects.return_value = [stored]
+
+        features = audio_features.get_audio_features(['track1'])
+
+        self.mock_get.assert_not_called()
+        self.assertEqual(features['track1']['energy'], 0.25)
+
+    def test_feature_ranges_span_both_users(self):
+        with patch('playlist.audio_features.get_song_analysis_matrix') as mock_matrix:
+            mock_matrix.side_effect = [
+                [[i / 10] * len(audio_features.FEATURE_NAMES) for i in range(5)],
+                [[i / 10] * len(audio_features.FEATURE_NAMES) for i in range(5, 11)],
+            ]
+            ranges = audio_features.get_feature_ranges(['user1', 'user2'], low=0, high=100)
+
+        self.assertDictEqual(ranges['energy'], {'min': 0.0, 'max': 1.0})
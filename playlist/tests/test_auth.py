@@ -0,0 +1,89 @@
+from unittest.mock import patch
+from unittest import TestCase
+
+from flask import Flask
+import jwt
+
+from playlist import auth
+from playlist.users import projection_fields, projections_cover
+
+SECRET = 'test-secret-' + '0' * 32
+
+
+class TestProjections(TestCase):
+    def test_parent_field_replaces_its_subfields(self):
+        self.assertEqual(projection_fields('versions', 'listening_data'),
+                         {'spotify_id', 'name', 'song_data', 'friends_modified',
+                          'playlists_modified'})
+
+    def test_coverage(self):
+        self.assertTrue(projections_cover({'listening_data'}, ('sync_state',)))
+        self.assertTrue(projections_cover({'sync'}, ('taste_profile', 'identity')))
+        self.assertFalse(projections_cover({'versions'}, ('listening_data',)))
+        self.assertFalse(projections_cover({'identity'}, ('friends',)))
+
+
+@patch('playlist.auth.find_user')
+class TestLoadUser(TestCase):
+    def setUp(self):
+        self.context = Flask(__name__).app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+
+    def test_user_is_fetched_once_per_request(self, mock_find_user):
+        first = auth.load_user('user1', 'listening_data')
+        second = auth.load_user('user1', 'sync_state')
+
+        self.assertIs(first, second)
+        mock_find_user.assert_called_once_with('user1', 'listening_data')
+
+    def test_missing_fields_refetch_with_every_projection(self, mock_find_user):
+        auth.load_user('user1', 'identity')
+        auth.load_user('user1', 'friends')
+        auth.load_user('user1', 'identity')
+
+        self.assertEqual(mock_find_user.call_count, 2)
+        self.assertCountEqual(mock_find_user.call_args[0][1:], ('identity', 'friends'))
+
+    def test_users_are_cached_separately(self, mock_find_user):
+        auth.load_user('user1', 'identity')
+        auth.load_user('user2', 'identity')
+
+        self.assertEqual(mock_find_user.call_count, 2)
+
+    def test_missing_user_is_not_cached(self, mock_find_user):
+        mock_find_user.return_value = None
+
+        self.assertIsNone(auth.load_user('user1', 'identity'))
+        auth.load_user('user1', 'identity')
+
+        self.assertEqual(mock_find_user.call_count, 2)
+
+
+@patch.dict('os.environ', JWT_SECRET=SECRET)
+class TestDecodeToken(TestCase):
+    def setUp(self):
+        auth.verified_tokens.clear()
+
+    def tearDown(self):
+        auth.verified_tokens.clear()
+
+    def test_token_is_verified_once(self):
+        token = jwt.encode({'id': 'user1', 'aud': 'client'}, SECRET, algorithm='HS256')
+
+        with patch('playlist.auth.jwt.decode', wraps=jwt.decode) as mock_decode:
+            self.assertEqual(auth.decode_token(token)['id'], 'user1')
+            self.assertEqual(auth.decode_token(token)['id'], 'user1')
+
+        self.assertEqual(mock_decode.call_count, 1)
+
+    def test_cached_token_still_expires(self):
+        token = jwt.encode({'id': 'user1', 'aud': 'client', 'exp': 2 ** 31},
+                           SECRET, algorithm='HS256')
+        auth.decode_token(token)
+
+        with patch('playlist.auth.time.time', return_value=2 ** 31 + 1):
+            with self.assertRaises(jwt.ExpiredSignatureError):
+                auth.decode_token(token)
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+from unittest import TestCase
+
+from playlist import catalog
+
+
+class TestCatalog(TestCase):
+    def setUp(self):
+        self.song = {
+            'name': "Good Enough For Granddad",
+            'id': "2jpDioAB9tlYXMdXDK3BGl",
+            'artists': [{'name': 'Squirrel Nut Zippers', 'id': "0LIll5i3kwo5A3IDpipgkS"}],
+            'explicit': False,
+        }
+        self.artist = {
+            'name': "David Bowie",
+            'id': "0oSGxfWSnnOXhD2fKuz2Gy",
+            'images': [],
+            'genres': ["art rock", "glam rock", "permanent wave"]
+        }
+
+    @patch('playlist.catalog.upsert')
+    def test_store_keeps_only_references(self, mock_upsert):
+        song_data = {
+            'saved_songs': [dict(self.song, added_at="2016-10-24T15:03:07Z")],
+            'top_songs': [self.song],
+            'top_artists': [self.artist],
+            'followed_artists': [self.artist],
+        }
+
+        catalog.store_song_data(song_data)
+
+        self.assertEqual(mock_upsert.call_count, 3)
+        credited_artists = mock_upsert.call_args_list[1][0]
+        self.assertEqual(credited_artists[0], catalog.Artist)
+        self.assertListEqual(credited_artists[1], self.song['artists'] * 2)
+        self.assertEqual(credited_artists[2], ('name',))
+        self.assertListEqual(song_data['saved_songs'],
+                             [{'id': self.song['id'], 'added_at': "2016-10-24T15:03:07Z"}])
+        self.assertListEqual(song_data['top_songs'], [{'id': self.song['id'], 'rank': 0}])
+        self.assertListEqual(song_data['top_artists'], [{'id': self.artist['id'], 'rank': 0}])
+        self.assertListEqual(song_data['followed_artists'], [{'id': self.artist['id']}])
+
+    @patch('playlist.catalog.lookup')
+    def test_expand_fills_references_from_catalog(self, mock_lookup):
+        stored_song = {key: value for key, value in self.song.items() if key != 'id'}
+        stored_artist = {key: value for key, value in self.artist.items() if key != 'id'}
+        mock_lookup.side_effect = [{self.song['id']: stored_song},
+                                   {self.artist['id']: stored_artist}]
+        song_data = {
+            'saved_songs': [{'id': self.song['id'], 'added_at': "2016-10-24T15:03:07Z"},
+                            {'id': 'removed-from-catalog'}],
+            'top_songs': [],
+            'top_artists': [{'id': self.artist['id'], 'rank': 0}],
+            'followed_artists': [],
+        }
+
+        expanded = catalog.expand_song_data(song_data)
+
+        self.assertListEqual(expanded['saved_songs'],
+                             [dict(self.song, added_at="2016-10-24T15:03:07Z")])
+        self.assertListEqual(expanded['top_artists'], [dict(self.artist, rank=0)])
+
+    @patch('playlist.catalog.lookup', return_value={})
+    def test_expanded_entries_are_left_alone(self, mock_lookup):
+        song_data = {'saved_songs': [self.song], 'top_songs': [],
+                     'top_artists': [self.artist], 'followed_artists': []}
+
+        expanded = catalog.expand_song_data(song_data)
+
+        self.assertListEqual(expanded['saved_songs'], [self.song])
+        self.assertListEqual(expanded['top_artists'], [self.artist])
+        self.assertEqual(mock_lookup.call_args_list[0][0][1], set())
+
+    @patch('playlist.catalog.lookup')
+    def test_names_come_from_the_catalog(self, mock_lookup):
+        mock_lookup.return_value = {self.artist['id']: {'name': self.artist['name']},
+                                    'unnamed': {}}
+
+        names = catalog.catalog_names('artist', [self.artist['id'], 'unnamed'])
+
+        self.assertEqual(names, {self.artist['id']: self.artist['name']})
+        self.assertEqual(mock_lookup.call_args[0][0], catalog.Artist)
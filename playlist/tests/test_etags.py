@@ -0,0 +1,65 @@
+from datetime import datetime
+from unittest.mock import patch
+from unittest import TestCase
+
+from flask import Flask
+
+from playlist import etags
+from playlist.models import User, SongData
+
+import main
+
+
+class TestETags(TestCase):
+    def test_etag_changes_with_any_part(self):
+        modified = datetime(2021, 3, 1)
+
+        self.assertEqual(etags.make_etag('friends', 'user1', modified),
+                         etags.make_etag('friends', 'user1', modified))
+        self.assertNotEqual(etags.make_etag('friends', 'user1', modified),
+                            etags.make_etag('friends', 'user1', datetime(2021, 3, 2)))
+
+    def test_weak_and_listed_etags_are_fresh(self):
+        app = Flask(__name__)
+        for header in ('"abc"', 'W/"abc"', '"xyz", "abc"', '*'):
+            with app.test_request_context(headers={'If-None-Match': header}):
+                self.assertTrue(etags.is_fresh('abc'), header)
+        with app.test_request_context(headers={'If-None-Match': '"xyz"'}):
+            self.assertFalse(etags.is_fresh('abc'))
+
+
+@patch('main.enqueue_sync')
+@patch('main.expand_song_data', return_value={})
+@patch('main.decode_token', return_value={'id': 'user1'})
+@patch('playlist.auth.find_user')
+class TestListeningHistoryETag(TestCase):
+    def setUp(self):
+        self.client = main.app.test_client()
+        self.user = User(name='user1', spotify_id='user1',
+                         song_data=SongData(modified=datetime.utcnow()))
+
+    def get(self, headers=None):
+        return self.client.get('/listening-history', query_string={'user_id': 'user1'},
+                               headers=dict(headers or {}, authorization='token'))
+
+    def test_unchanged_poll_skips_the_listening_data(self, mock_find_user, *mocks):
+        mock_find_user.return_value = self.user
+        etag = self.get().headers['ETag']
+        self.assertIn('listening_data', mock_find_user.call_args[0])
+        mock_find_user.reset_mock()
+
+        response = self.get({'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        mock_find_user.assert_called_once_with('user1', 'versions')
+
+    def test_new_sync_changes_the_etag(self, mock_find_user, *mocks):
+        mock_find_user.return_value = self.user
+        etag = self.get().headers['ETag']
+        self.user.song_data.modified = datetime.utcnow()
+
+        response = self.get({'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
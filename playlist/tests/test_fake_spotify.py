@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from fake_spotify import create_app
+
+
+class TestFakeSpotify(TestCase):
+    def setUp(self):
+        self.client = create_app({'songs': 120}).test_client()
+        token = self.client.post('/api/token', data={
+            'grant_type': 'authorization_code', 'code': 'user1'}).get_json()
+        self.headers = {'Authorization': F"Bearer {token['access_token']}"}
+
+    def test_saved_tracks_are_paginated(self):
+        first = self.client.get('/v1/me/tracks?offset=0&limit=500', headers=self.headers).get_json()
+        last = self.client.get('/v1/me/tracks?offset=100&limit=50', headers=self.headers).get_json()
+
+        self.assertEqual(len(first['items']), 50)
+        self.assertEqual(first['total'], 120)
+        self.assertIn('offset=50', first['next'])
+        self.assertEqual(len(last['items']), 20)
+        self.assertIsNone(last['next'])
+
+    def test_unknown_token_is_rejected(self):
+        response = self.client.get('/v1/me', headers={'Authorization': 'Bearer nope'})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_rate_limit_answers_429_with_retry_after(self):
+        client = create_app({'songs': 120, 'rate_limit': 1, 'retry_after': 3}).test_client()
+
+        client.get('/v1/me')
+        response = client.get('/v1/me')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '3')
+
+    def test_injected_errors(self):
+        client = create_app({'songs': 120, 'error_rate': {'me': 1}}).test_client()
+
+        self.assertGreaterEqual(client.get('/v1/me').status_code, 500)
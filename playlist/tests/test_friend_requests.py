@@ -0,0 +1,30 @@
+from unittest.mock import patch
+from unittest import TestCase
+
+from playlist import friend_requests
+
+
+class TestAcceptFriendRequest(TestCase):
+    def setUp(self):
+        self.user_patcher = patch('playlist.friend_requests.User')
+        self.mock_objects = self.user_patcher.start().objects
+
+    def tearDown(self):
+        self.user_patcher.stop()
+
+    def test_pending_request_is_accepted_on_both_sides(self):
+        self.mock_objects.return_value.update_one.return_value = 1
+
+        self.assertTrue(friend_requests.accept_friend_request('a', 'b'))
+
+        self.assertEqual(self.mock_objects.call_args_list[0][1], {
+            'spotify_id': 'a', 'friends__match': {'friend_id': 'b', 'status': 'pending'}})
+        self.assertEqual(self.mock_objects.call_args_list[1][1], {
+            'spotify_id': 'b', 'friends__match': {'friend_id': 'a', 'status': 'requested'}})
+
+    def test_nothing_to_accept(self):
+        self.mock_objects.return_value.update_one.return_value = 0
+
+        self.assertFalse(friend_requests.accept_friend_request('a', 'b'))
+
+        self.assertEqual(self.mock_objects.call_count, 1)
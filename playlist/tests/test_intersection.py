@@ -1,5 +1,9 @@
+from datetime import datetime
+from unittest.mock import patch
 from unittest import TestCase
 from playlist import intersection
+from playlist.minhash import NUM_HASHES
+from playlist.models import User, TasteProfile
 
 # Mock API data from Spotify API Docs :
 # https://developer.spotify.com/documentation/web-api/reference/
@@ -103,3 +107,20 @@ class TestFindIntersection(TestCase):
 
         common_items = intersection.get_user_intersection(self.user1, self.user2)
         self.assertDictEqual(result, common_items)
+
+    @patch('playlist.intersection.catalog_names')
+    def test_stored_profiles_take_names_from_the_catalog(self, mock_catalog_names):
+        def user(spotify_id, song_ids):
+            stored = User(name=spotify_id, spotify_id=spotify_id, taste_profile=TasteProfile(
+                modified=datetime.utcnow(), song_ids=song_ids, artist_ids=[],
+                top_genres=[], minhash=list(range(NUM_HASHES))))
+            stored.song_data.modified = stored.taste_profile.modified
+            return stored
+        mock_catalog_names.return_value = {'15iosIuxC3C53BgsM5Uggs': 'All Night'}
+
+        common_songs = intersection.find_common_songs(
+            user('user1', ['15iosIuxC3C53BgsM5Uggs', 'only-user1']),
+            user('user2', ['15iosIuxC3C53BgsM5Uggs', 'only-user2']))
+
+        self.assertListEqual(common_songs, [{'id': '15iosIuxC3C53BgsM5Uggs', 'name': 'All Night'}])
+        mock_catalog_names.assert_called_once_with('track', {'15iosIuxC3C53BgsM5Uggs'})
@@ -0,0 +1,110 @@
+from datetime import datetime
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+from mongoengine.errors import NotUniqueError
+
+from playlist import jobs
+
+
+class TestPlaylistJobs(TestCase):
+    def setUp(self):
+        self.patchers = [patch(F'playlist.jobs.{name}') for name in
+                         ('Job', 'find_user', 'generate_playlist', 'save_playlist',
+                          'pooled_recommendations')]
+        (self.mock_job, self.mock_find_user, self.mock_generate, self.mock_save,
+         self.mock_pooled) = [patcher.start() for patcher in self.patchers]
+        self.job = Mock(id='job1', kind='playlist', user_id='user1', payload={
+            'friend_id': 'user2', 'filter_explicit': None, 'seeds': None, 'features': None})
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_result_and_stages_are_recorded(self):
+        self.mock_save.return_value.to_json.return_value = '{"uri": "spotify:playlist:abc"}'
+
+        jobs.run_job(self.job)
+
+        update = self.mock_job.objects.return_value.update_one.call_args[1]
+        self.assertEqual(update['set__status'], 'done')
+        self.assertEqual(update['set__result'], {'uri': 'spotify:playlist:abc'})
+        self.assertIn('load_users', update['set__stages'])
+        self.assertIn('save', update['set__stages'])
+        self.assertIs(self.mock_generate.call_args[1]['stages'], self.job.stages)
+        self.assertIs(self.mock_generate.call_args[1]['recommendations'],
+                      self.mock_pooled.return_value)
+
+    def test_missing_friend_fails_the_job(self):
+        self.mock_find_user.side_effect = [Mock(), None]
+
+        jobs.run_job(self.job)
+
+        update = self.mock_job.objects.return_value.update_one.call_args[1]
+        self.assertEqual(update['set__status'], 'failed')
+        self.assertIn('user2', update['set__error'])
+        self.mock_generate.assert_not_called()
+
+
+@patch('playlist.jobs.Job')
+class TestJobQueue(TestCase):
+    def test_enqueue_is_deduplicated_per_user(self, mock_job):
+        job = jobs.enqueue_sync('user1')
+
+        mock_job.objects.assert_called_once_with(dedup_key='sync:user1')
+        modify = mock_job.objects.return_value.modify
+        self.assertIs(job, modify.return_value)
+        self.assertTrue(modify.call_args[1]['upsert'])
+        # Only an inserted job gets these; an existing one is returned as is.
+        self.assertEqual(modify.call_args[1]['set_on_insert__status'], 'queued')
+        self.assertEqual(modify.call_args[1]['set_on_insert__user_id'], 'user1')
+
+    def test_enqueue_race_returns_the_winning_job(self, mock_job):
+        mock_job.objects.return_value.modify.side_effect = NotUniqueError()
+
+        job = jobs.enqueue_sync('user1')
+
+        self.assertIs(job, mock_job.objects.return_value.first.return_value)
+
+    def test_oldest_queued_job_is_claimed(self, mock_job):
+        job = jobs.claim_job()
+
+        mock_job.objects.assert_called_once_with(status='queued')
+        ordered = mock_job.objects.return_value.order_by
+        ordered.assert_called_once_with('created')
+        self.assertIs(job, ordered.return_value.modify.return_value)
+        claimed = ordered.return_value.modify.call_args[1]
+        self.assertEqual(claimed['set__status'], 'running')
+        self.assertTrue(claimed['new'])
+
+    def test_only_jobs_running_past_the_timeout_are_requeued(self, mock_job):
+        before = datetime.utcnow()
+        jobs.requeue_stale_jobs()
+
+        query = mock_job.objects.call_args[1]
+        self.assertEqual(query['status'], 'running')
+        self.assertLessEqual(query['started__lt'], datetime.utcnow() - jobs.JOB_TIMEOUT)
+        self.assertGreaterEqual(query['started__lt'], before - jobs.JOB_TIMEOUT)
+        self.assertEqual(mock_job.objects.return_value.update.call_args[1],
+                         {'set__status': 'queued', 'unset__started': True})
+
+    def test_finished_jobs_release_their_dedup_key(self, mock_job):
+        with patch.dict(jobs.HANDLERS, sync=Mock(return_value=None)):
+            jobs.run_job(Mock(id='job1', kind='sync', user_id='user1'))
+
+        update = mock_job.objects.return_value.update_one.call_args[1]
+        self.assertEqual(update['set__status'], 'done')
+        self.assertTrue(update['unset__dedup_key'])
+
+
+class TestPoolFillQueue(TestCase):
+    @patch('playlist.jobs.Job')
+    def test_replacing_fill_is_not_folded_into_a_top_up(self, mock_job):
+        jobs.enqueue_pool_fill('a', 'b')
+        jobs.enqueue_pool_fill('b', 'a', replace=True)
+        jobs.enqueue_pool_fill('a', 'b', replace=True)
+
+        keys = [call[1]['dedup_key'] for call in mock_job.objects.call_args_list]
+        self.assertEqual(keys, ['pool:a:b', 'pool:a:b:replace', 'pool:a:b:replace'])
+        payload = mock_job.objects.return_value.modify.call_args[1]['set_on_insert__payload']
+        self.assertEqual(payload, {'friend_id': 'b', 'replace': True})
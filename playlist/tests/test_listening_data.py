@@ -1,6 +1,8 @@
+from datetime import datetime, timedelta
 from unittest.mock import Mock, patch
 from unittest import TestCase
 from playlist import listening_data
+from playlist.models import User
 
 # Mock API data from Spotify API Docs :
 # https://developer.spotify.com/documentation/web-api/reference/
@@ -8,8 +10,8 @@ from playlist import listening_data
 class TestGetListeningData(TestCase):
     @classmethod
     def setup_class(cls):
-        cls.mock_get_patcher = patch('playlist.listening_data.requests.get')
-        cls.mock_get = cls.mock_get_patcher.start()
+        cls.mock_client_patcher = patch('playlist.listening_data.get_client')
+        cls.mock_get = cls.mock_client_patcher.start().return_value.get
         cls.user = {
             "name":"Verlie Breitenberg",
             "spotify_id":"bdb1ffa9-6c46-4a8a-9d6f-3227b1ab399c",
@@ -21,7 +23,7 @@ class TestGetListeningData(TestCase):
 
     @classmethod
     def teardown_class(cls):
-        cls.mock_get_patcher.stop()
+        cls.mock_client_patcher.stop()
         
 
     def test_get_top_artists_response_ok(self):
@@ -233,6 +235,7 @@ class TestGetListeningData(TestCase):
             'id': "2jpDioAB9tlYXMdXDK3BGl",
             'artists': [ {'name': 'Squirrel Nut Zippers', 'id':"0LIll5i3kwo5A3IDpipgkS"} ],
             'explicit': False,
+            'added_at': "2016-10-24T15:03:07Z",
         }]
                 
         self.mock_get.return_value = Mock()
@@ -332,3 +335,70 @@ class TestGetListeningData(TestCase):
         self.assertListEqual(top_artists, result)
 
 
+    def test_get_saved_tracks_fetches_remaining_pages_in_order(self):
+        def saved_tracks_page(url, **kwargs):
+            offset = int(url.split('offset=')[1].split('&')[0])
+            response = Mock()
+            response.json.return_value = {
+                "items": [{"track": {"name": F"Song {i}", "id": str(i),
+                                     "artists": [], "explicit": False}}
+                          for i in range(offset, min(offset + 50, 120))],
+                "next": "next-page" if offset + 50 < 120 else None,
+                "total": 120,
+            }
+            return response
+
+        self.mock_get.side_effect = saved_tracks_page
+        try:
+            saved_songs = listening_data.get_listening_data(self.user, 'saved_songs')
+        finally:
+            self.mock_get.side_effect = None
+
+        self.assertListEqual([song['id'] for song in saved_songs],
+                             [str(i) for i in range(120)])
+
+    def test_saved_songs_delta_stops_at_known_track(self):
+        stored_song = {'name': 'All Night', 'id': '15iosIuxC3C53BgsM5Uggs',
+                       'artists': [], 'explicit': False, 'added_at': '2016-10-24T15:03:07Z'}
+        user = dict(self.user, song_data={
+            'saved_songs': [stored_song],
+            'saved_songs_reconciled': datetime.utcnow()
+        })
+        response = {
+            "items": [
+                {"added_at": "2016-11-01T10:00:00Z",
+                 "track": {"name": "Music Is Life", "id": "1TKYPzH66GwsqyJFKFkBHQ",
+                           "artists": [], "explicit": False}},
+                {"added_at": "2016-10-24T15:03:07Z",
+                 "track": {"name": "All Night", "id": "15iosIuxC3C53BgsM5Uggs",
+                           "artists": [], "explicit": False}},
+            ],
+            "next": "https://api.spotify.com/v1/me/tracks?offset=50&limit=50",
+            "total": 2000,
+        }
+        self.mock_get.return_value = Mock()
+        self.mock_get.return_value.json.return_value = response
+        self.mock_get.reset_mock()
+
+        saved_songs = listening_data.sync_saved_songs(user)
+
+        self.assertEqual(self.mock_get.call_count, 1)
+        self.assertListEqual([song['id'] for song in saved_songs],
+                             ['1TKYPzH66GwsqyJFKFkBHQ', '15iosIuxC3C53BgsM5Uggs'])
+        self.assertEqual(saved_songs[0]['added_at'], '2016-11-01T10:00:00Z')
+
+
+class TestIsStale(TestCase):
+    def test_new_user_has_never_synced(self):
+        user = User(name='New User', spotify_id='new-user')
+
+        self.assertIsNone(user.song_data.modified)
+        self.assertTrue(listening_data.is_stale(user))
+
+    def test_recent_sync_is_fresh(self):
+        user = User(name='Synced User', spotify_id='synced-user')
+        user.song_data.modified = datetime.utcnow()
+        self.assertFalse(listening_data.is_stale(user))
+
+        user.song_data.modified -= listening_data.STALE_AFTER + timedelta(minutes=1)
+        self.assertTrue(listening_data.is_stale(user))
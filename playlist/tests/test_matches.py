@@ -0,0 +1,50 @@
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+import numpy as np
+
+from playlist import matches
+
+
+class TestCountCommon(TestCase):
+    def test_counts_overlap_per_friend(self):
+        own_ids = ['15iosIuxC3C53BgsM5Uggs', '2jpDioAB9tlYXMdXDK3BGl', '1TKYPzH66GwsqyJFKFkBHQ']
+        friend_ids = [
+            ['15iosIuxC3C53BgsM5Uggs', '0c6xIDDpzE81m2q797ordA'],
+            [],
+            ['2jpDioAB9tlYXMdXDK3BGl', '1TKYPzH66GwsqyJFKFkBHQ', '15iosIuxC3C53BgsM5Uggs'],
+            ['0c6xIDDpzE81m2q797ordA'],
+        ]
+
+        self.assertListEqual(matches.count_common(own_ids, friend_ids).tolist(), [1, 0, 3, 0])
+
+    def test_no_ids_at_all(self):
+        self.assertListEqual(matches.count_common([], [[], []]).tolist(), [0, 0])
+
+
+@patch('playlist.matches.get_profile')
+@patch('playlist.matches.User')
+class TestSuggestedMatches(TestCase):
+    def candidates(self, count):
+        return [Mock(spotify_id=F'user{i}', taste_profile=Mock(minhash=np.arange(
+            matches.NUM_HASHES, dtype=np.uint64))) for i in range(count)]
+
+    def test_limit_is_clamped(self, mock_user, mock_get_profile):
+        mock_get_profile.return_value = Mock(song_ids=['a'], artist_ids=[], lsh_bands=['0:1'],
+                                             minhash=list(range(matches.NUM_HASHES)))
+        mock_user.objects.return_value.only.return_value = self.candidates(60)
+
+        self.assertEqual(len(matches.find_suggested_matches(Mock(), 100, exact_matches=0)),
+                         matches.MAX_MATCHES)
+        self.assertEqual(len(matches.find_suggested_matches(Mock(), -5, exact_matches=0)), 1)
+
+    def test_signatures_from_an_older_configuration_are_skipped(self, mock_user,
+                                                                mock_get_profile):
+        mock_get_profile.return_value = Mock(song_ids=['a'], artist_ids=[], lsh_bands=['0:1'],
+                                             minhash=list(range(matches.NUM_HASHES)))
+        outdated = Mock(spotify_id='old', taste_profile=Mock(minhash=list(range(128))))
+        mock_user.objects.return_value.only.return_value = self.candidates(1) + [outdated]
+
+        found = matches.find_suggested_matches(Mock(), exact_matches=0)
+
+        self.assertEqual([match['spotify_id'] for match in found], ['user0'])
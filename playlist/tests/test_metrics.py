@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from unittest import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+from playlist import metrics
+
+
+class TestMetrics(TestCase):
+    def test_spotify_endpoints_drop_ids(self):
+        self.assertEqual(metrics.spotify_endpoint(
+            'https://api.spotify.com/v1/playlists/37i9dQZF1DX/tracks?offset=0'),
+            'playlists/{id}/tracks')
+        self.assertEqual(metrics.spotify_endpoint(
+            'https://api.spotify.com/v1/users/someone/playlists'), 'users/{id}/playlists')
+        self.assertEqual(metrics.spotify_endpoint(
+            'https://accounts.spotify.com/api/token'), 'token')
+
+    def test_caller_and_breakdown_follow_work_into_executor_threads(self):
+        breakdown = metrics.start_breakdown('some_route')
+
+        @metrics.spotify_caller
+        def fetch_everything():
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                return list(executor.map(metrics.in_current_context(
+                    lambda _: metrics.record_breakdown(F'spotify:{metrics.current_caller()}', 0.5)),
+                    range(3)))
+
+        fetch_everything()
+
+        self.assertEqual(breakdown.summary(),
+                         {'spotify:fetch_everything': {'count': 3, 'seconds': 1.5}})
+        self.assertEqual(metrics.current_caller(), 'some_route')
+
+    def test_mongo_commands_are_timed(self):
+        breakdown = metrics.start_breakdown()
+        labels = {'command': 'find', 'status': 'ok'}
+        before = metrics.REGISTRY.get_sample_value('mongo_command_duration_seconds_sum', labels) or 0
+
+        metrics.MongoCommandListener().succeeded(Mock(command_name='find', duration_micros=2500))
+
+        after = metrics.REGISTRY.get_sample_value('mongo_command_duration_seconds_sum', labels)
+        self.assertAlmostEqual(after - before, 0.0025)
+        self.assertEqual(breakdown.summary(), {'mongo:find': {'count': 1, 'seconds': 0.0025}})
+
+
+class TestGunicornMetrics(TestCase):
+    def test_forked_workers_are_aggregated(self):
+        # Runs in a fresh interpreter so prometheus_client is first imported
+        # the way it is under gunicorn: after gunicorn.conf.py has run.
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        script = textwrap.dedent('''
+            import os, runpy, sys
+            config = runpy.run_path('gunicorn.conf.py')
+            config['on_starting'](None)
+            pid = os.fork()
+            if pid == 0:
+                from playlist import metrics
+                metrics.observe_request('GET', '/friends', 200, 0.25)
+                os._exit(0)
+            os.waitpid(pid, 0)
+            from playlist import metrics
+            sys.stdout.write(metrics.render()[0].decode())
+        ''')
+        env = {key: value for key, value in os.environ.items()
+               if key != 'PROMETHEUS_MULTIPROC_DIR'}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # The config's default metrics directory lands under TMPDIR.
+            output = subprocess.run(
+                [sys.executable, '-c', script], cwd=root, check=True, capture_output=True,
+                text=True, env=dict(env, TMPDIR=temp_dir)).stdout
+
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/friends",'
+                      'status="200"} 1.0', output)
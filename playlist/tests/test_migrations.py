@@ -0,0 +1,47 @@
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+from playlist import migrations
+
+
+class TestMigrations(TestCase):
+    def test_only_missing_indexes_are_created(self):
+        collection = Mock()
+        collection.name = 'user'
+        collection.index_information.return_value = {
+            '_id_': {'key': [('_id', 1)]},
+            'spotify_id_1': {'key': [('spotify_id', 1)], 'unique': True},
+        }
+        document = Mock(_meta={'index_specs': [
+            {'fields': [('spotify_id', 1)], 'unique': True},
+            {'fields': [('playlists.uri', 1)]},
+        ]})
+        document._get_collection.return_value = collection
+
+        report = migrations.create_indexes([document])
+
+        self.assertEqual(report, [('user', [('spotify_id', 1)], 'exists'),
+                                  ('user', [('playlists.uri', 1)], 'created')])
+        collection.create_index.assert_called_once_with([('playlists.uri', 1)], background=True)
+
+    def test_collection_scans_are_reported(self):
+        def explained(plan):
+            return lambda: Mock(explain=Mock(return_value={'queryPlanner': {'winningPlan': plan}}))
+
+        scans = migrations.find_collection_scans({
+            'indexed': explained({'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}),
+            'unindexed': explained({'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}),
+        })
+
+        self.assertEqual(scans, ['unindexed'])
+
+    @patch('playlist.migrations.User')
+    def test_only_users_without_listening_data_are_marked_unsynced(self, mock_user):
+        migrations.clear_unsynced_modified()
+
+        query = mock_user.objects.call_args[1]['__raw__']
+        self.assertIsNone(query['taste_profile'])
+        for name in ('saved_songs', 'followed_artists', 'top_songs', 'top_artists'):
+            self.assertEqual(query[F'song_data.{name}.0'], {'$exists': False})
+        mock_user.objects.return_value.update.assert_called_once_with(
+            unset__song_data__modified=True)
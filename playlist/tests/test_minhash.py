@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from playlist import minhash
+
+
+class TestMinHash(TestCase):
+    def test_identical_sets_share_every_band(self):
+        tokens = [F'song:{i}' for i in range(300)]
+        signature1 = minhash.minhash_signature(tokens)
+        signature2 = minhash.minhash_signature(list(reversed(tokens)))
+
+        self.assertEqual(minhash.estimate_similarity(signature1, signature2), 1.0)
+        self.assertListEqual(minhash.lsh_bands(signature1), minhash.lsh_bands(signature2))
+
+    def test_estimate_tracks_jaccard_similarity(self):
+        shared = [F'song:{i}' for i in range(600)]
+        tokens1 = shared + [F'song:a{i}' for i in range(200)]
+        tokens2 = shared + [F'song:b{i}' for i in range(200)]
+
+        estimate = minhash.estimate_similarity(minhash.minhash_signature(tokens1),
+                                               minhash.minhash_signature(tokens2))
+
+        self.assertAlmostEqual(estimate, 0.6, delta=0.15)
+
+    def test_unrelated_sets_rarely_share_bands(self):
+        signature1 = minhash.minhash_signature([F'song:a{i}' for i in range(500)])
+        signature2 = minhash.minhash_signature([F'song:b{i}' for i in range(500)])
+
+        shared_bands = set(minhash.lsh_bands(signature1)) & set(minhash.lsh_bands(signature2))
+        self.assertLess(minhash.estimate_similarity(signature1, signature2), 0.1)
+        self.assertLessEqual(len(shared_bands), 1)
+
+    def test_chunked_signature_matches_single_pass(self):
+        tokens = [F'artist:{i}' for i in range(minhash.CHUNK_SIZE + 100)]
+        chunked = minhash.minhash_signature(tokens)
+
+        hashes = minhash.minhash_signature(tokens[:minhash.CHUNK_SIZE])
+        rest = minhash.minhash_signature(tokens[minhash.CHUNK_SIZE:])
+        self.assertListEqual(chunked.tolist(), [min(a, b) for a, b in zip(hashes, rest)])
+
+    def test_pairs_with_realistic_overlap_are_usually_candidates(self):
+        # 182 shared of 1000 tokens each is a Jaccard similarity of ~0.1.
+        found = 0
+        for pair in range(20):
+            shared = [F'song:{pair}-{i}' for i in range(182)]
+            bands1 = minhash.lsh_bands(minhash.minhash_signature(
+                shared + [F'song:{pair}-a{i}' for i in range(818)]))
+            bands2 = minhash.lsh_bands(minhash.minhash_signature(
+                shared + [F'song:{pair}-b{i}' for i in range(818)]))
+            found += bool(set(bands1) & set(bands2))
+
+        self.assertGreaterEqual(found, 10)
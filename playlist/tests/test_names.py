@@ -0,0 +1,69 @@
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+from playlist import names, recommendations
+
+
+class TestSeedNames(TestCase):
+    def setUp(self):
+        self.client_patcher = patch('playlist.names.get_client')
+        self.mock_get = self.client_patcher.start().return_value.get
+        self.catalog_patcher = patch('playlist.names.catalog_names', return_value={})
+        self.mock_catalog_names = self.catalog_patcher.start()
+        names.name_cache.clear()
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        self.catalog_patcher.stop()
+        names.name_cache.clear()
+
+    def test_known_names_need_no_request(self):
+        names.remember_song_data({
+            'top_songs': [{'name': 'All Night', 'id': '15iosIuxC3C53BgsM5Uggs',
+                           'artists': [{'id': '1VBflYyxBhnDc9uVib98rw', 'name': 'Icona Pop'}]}],
+            'saved_songs': [],
+            'top_artists': [],
+            'followed_artists': []
+        })
+        get_token = Mock()
+
+        seed_names = recommendations.get_seed_names(
+            [{'15iosIuxC3C53BgsM5Uggs': 'song'}, {'1VBflYyxBhnDc9uVib98rw': 'artist'},
+             {'glam rock': 'genre'}], get_token)
+
+        self.assertListEqual(seed_names, ['All Night (song)', 'Icona Pop (artist)',
+                                          'glam rock (genre)'])
+        self.mock_get.assert_not_called()
+
+    def test_unknown_names_are_fetched_in_batches(self):
+        def several(url, token=None, params=None):
+            response = Mock()
+            response.json.return_value = {url: [{'id': object_id, 'name': F'name {object_id}'}
+                                                for object_id in params['ids'].split(',')]}
+            return response
+
+        self.mock_get.side_effect = several
+        artist_ids = [F'artist{i}' for i in range(60)]
+
+        result = names.names_from_ids({'track': ['track1'], 'artist': artist_ids},
+                                      lambda: 'token')
+
+        self.assertEqual(self.mock_get.call_count, 3)
+        self.assertEqual(result[('track', 'track1')], 'name track1')
+        self.assertEqual(result[('artist', 'artist59')], 'name artist59')
+        self.assertEqual(names.name_cache.get(('artist', 'artist0')), 'name artist0')
+
+    def test_catalog_names_need_no_request(self):
+        self.mock_catalog_names.side_effect = lambda object_type, ids: {
+            object_id: F'catalog {object_id}' for object_id in ids if object_id != 'new'}
+        self.mock_get.return_value.json.return_value = {'tracks': [{'id': 'new', 'name': 'New'}]}
+
+        result = names.names_from_ids({'track': ['track1', 'new'], 'artist': ['artist1']},
+                                      lambda: 'token')
+
+        self.assertEqual(result[('track', 'track1')], 'catalog track1')
+        self.assertEqual(result[('artist', 'artist1')], 'catalog artist1')
+        self.assertEqual(result[('track', 'new')], 'New')
+        self.mock_get.assert_called_once()
+        self.assertEqual(self.mock_get.call_args[1]['params'], {'ids': 'new'})
+        self.assertEqual(names.name_cache.get(('track', 'track1')), 'catalog track1')
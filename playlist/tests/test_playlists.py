@@ -0,0 +1,90 @@
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+from playlist import playlists
+
+
+def track(i):
+    return {'track': {'name': F'song {i}', 'id': F'id{i}', 'artists': [{'name': 'artist'}]}}
+
+
+class TestPlaylistTracks(TestCase):
+    def setUp(self):
+        self.client_patcher = patch('playlist.playlists.get_client')
+        self.token_patcher = patch('playlist.playlists.get_access_token', return_value='token')
+        self.mock_get = self.client_patcher.start().return_value.get
+        self.token_patcher.start()
+        self.snapshot = 'snapshot1'
+        self.mock_get.side_effect = self.spotify_get
+        playlists.playlist_tracks_cache.clear()
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        self.token_patcher.stop()
+        playlists.playlist_tracks_cache.clear()
+
+    def spotify_get(self, url, token=None, params=None):
+        response = Mock()
+        if url.endswith('/tracks'):
+            offset = params['offset']
+            end = min(offset + params['limit'], 250)
+            response.json.return_value = {'items': [track(i) for i in range(offset, end)]}
+        else:
+            response.json.return_value = {'snapshot_id': self.snapshot, 'tracks': {'total': 250}}
+        return response
+
+    def test_all_pages_are_listed_in_order(self):
+        tracks = playlists.get_tracks_from_id('pl1')
+
+        self.assertEqual(len(tracks), 250)
+        self.assertEqual(tracks[0], {'name': 'song 0', 'id': 'id0', 'artists': ['artist']})
+        self.assertEqual(tracks[-1]['id'], 'id249')
+        self.assertEqual(self.mock_get.call_count, 4)
+
+    def test_unchanged_snapshot_is_served_from_cache(self):
+        playlists.get_tracks_from_id('pl1')
+        self.mock_get.reset_mock()
+
+        tracks = playlists.get_tracks_from_id('pl1')
+
+        self.assertEqual(len(tracks), 250)
+        self.assertEqual(self.mock_get.call_count, 1)
+
+    def test_new_snapshot_is_fetched_again(self):
+        playlists.get_tracks_from_id('pl1')
+        self.snapshot = 'snapshot2'
+        self.mock_get.reset_mock()
+
+        playlists.get_tracks_from_id('pl1')
+
+        self.assertEqual(self.mock_get.call_count, 4)
+
+
+class TestUserPlaylists(TestCase):
+    def setUp(self):
+        self.user_patcher = patch('playlist.playlists.User')
+        self.mock_aggregate = self.user_patcher.start()._get_collection.return_value.aggregate
+
+    def tearDown(self):
+        self.user_patcher.stop()
+
+    def test_friend_filter_and_paging_run_in_the_pipeline(self):
+        self.mock_aggregate.return_value = iter([{'uri': F'spotify:playlist:{i}'} for i in range(3)])
+
+        playlists_page, next_offset = playlists.get_user_playlists('me', 'friend', offset=4, limit=2)
+
+        pipeline = self.mock_aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'spotify_id': 'me'}})
+        self.assertIn({'$match': {'playlists.owners': 'friend'}}, pipeline)
+        self.assertIn({'$skip': 4}, pipeline)
+        self.assertIn({'$limit': 3}, pipeline)
+        self.assertEqual(len(playlists_page), 2)
+        self.assertEqual(next_offset, 6)
+
+    def test_last_page_has_no_next_offset(self):
+        self.mock_aggregate.return_value = iter([{'uri': 'spotify:playlist:0'}])
+
+        playlists_page, next_offset = playlists.get_user_playlists('me')
+
+        self.assertEqual(len(playlists_page), 1)
+        self.assertIsNone(next_offset)
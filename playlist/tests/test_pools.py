@@ -0,0 +1,81 @@
+from unittest.mock import Mock, patch
+from unittest import TestCase
+
+from playlist import pools
+
+
+def pooled_track(i, explicit=False):
+    return {'id': F'id{i}', 'name': F'song {i}', 'artists': [], 'explicit': explicit,
+            'seeds': [F'seed {i % 2} (genre)']}
+
+
+class TestRecommendationPools(TestCase):
+    def setUp(self):
+        self.pool_patcher = patch('playlist.pools.RecommendationPool')
+        self.mock_objects = self.pool_patcher.start().objects
+
+    def tearDown(self):
+        self.pool_patcher.stop()
+
+    def set_pool(self, tracks):
+        self.mock_objects.return_value.only.return_value.first.return_value = (
+            Mock(tracks=tracks) if tracks is not None else None)
+
+    def test_draw_filters_explicit_tracks_and_removes_them_from_the_pool(self):
+        self.set_pool([pooled_track(i, explicit=i < 10) for i in range(40)])
+
+        recommendations, remaining = pools.draw_from_pool('b', 'a', filter_explicit=True)
+
+        drawn = recommendations['recommendations']
+        self.assertEqual(len(drawn), 20)
+        self.assertFalse(any(track['explicit'] for track in drawn))
+        self.assertNotIn('seeds', drawn[0])
+        self.assertEqual(sorted(recommendations['seeds']), ['seed 0 (genre)', 'seed 1 (genre)'])
+        self.assertEqual(remaining, 20)
+        self.mock_objects.assert_any_call(pair_id='a:b')
+        pulled = self.mock_objects.return_value.update_one.call_args[1]['__raw__']
+        self.assertEqual(sorted(pulled['$pull']['tracks']['id']['$in']),
+                         sorted(track['id'] for track in drawn))
+
+    def test_short_pool_falls_back(self):
+        self.set_pool([pooled_track(i, explicit=True) for i in range(30)])
+
+        self.assertEqual(pools.draw_from_pool('a', 'b', filter_explicit=True), (None, 30))
+
+    def test_missing_pool_falls_back(self):
+        self.set_pool(None)
+
+        self.assertEqual(pools.draw_from_pool('a', 'b'), (None, None))
+
+    @patch('playlist.pools.get_user_intersection')
+    @patch('playlist.pools.find_user')
+    @patch('playlist.pools.get_pool_recommendations')
+    def test_fill_skips_tracks_already_pooled(self, mock_recommendations, mock_find_user,
+                                              mock_intersection):
+        self.set_pool([pooled_track(0)])
+        mock_recommendations.return_value = {
+            'seeds': ['glam rock (genre)'],
+            'recommendations': [{'id': F'id{i}', 'explicit': False} for i in range(3)]}
+
+        with patch('playlist.pools.POOL_SIZE', 3):
+            size = pools.fill_pool('a', 'b')
+
+        self.assertEqual(size, 3)
+        pushed = self.mock_objects.return_value.update_one.call_args[1]['push_all__tracks']
+        self.assertEqual([track['id'] for track in pushed], ['id1', 'id2'])
+        self.assertEqual(pushed[0]['seeds'], ['glam rock (genre)'])
+
+    @patch('playlist.pools.find_user')
+    def test_only_current_friends_are_pool_partners(self, mock_find_user):
+        mock_find_user.return_value = Mock(friends=[Mock(friend_id='b', status='accepted'),
+                                                    Mock(friend_id='c', status='pending')])
+        self.mock_objects.return_value.only.return_value = [
+            Mock(user_ids=['a', 'b']), Mock(user_ids=['a', 'c']), Mock(user_ids=['a', 'd'])]
+
+        self.assertEqual(pools.pool_partners('a'), ['b'])
+
+    def test_pool_is_deleted_by_pair(self):
+        pools.delete_pool('b', 'a')
+
+        self.mock_objects.assert_called_once_with(pair_id='a:b')
+        self.mock_objects.return_value.delete.assert_called_once_with()
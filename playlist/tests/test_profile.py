@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from unittest import TestCase
+
+from playlist import profile
+from playlist.minhash import NUM_HASHES
+from playlist.models import User, TasteProfile, SongData
+
+
+class TestGetProfile(TestCase):
+    def setUp(self):
+        self.patchers = [patch(F'playlist.profile.{name}') for name in
+                         ('find_user', 'expand_song_data', 'build_profile')]
+        self.mock_find_user, self.mock_expand, self.mock_build = [
+            patcher.start() for patcher in self.patchers]
+        self.objects_patcher = patch.object(User, 'objects')
+        self.mock_objects = self.objects_patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers + [self.objects_patcher]:
+            patcher.stop()
+
+    def user(self, synced, built, minhash_size=NUM_HASHES):
+        return User(name='user1', spotify_id='user1', song_data=SongData(modified=synced),
+                    taste_profile=TasteProfile(modified=built,
+                                               minhash=list(range(minhash_size))))
+
+    def test_current_profile_is_used_as_stored(self):
+        now = datetime.utcnow()
+        user = self.user(synced=now, built=now)
+
+        self.assertIs(profile.get_profile(user), user.taste_profile)
+        self.mock_find_user.assert_not_called()
+        self.mock_build.assert_not_called()
+
+    def test_newer_sync_rebuilds_and_stores_the_profile(self):
+        now = datetime.utcnow()
+        user = self.user(synced=now, built=now - timedelta(hours=1))
+
+        rebuilt = profile.get_profile(user)
+
+        self.assertIs(rebuilt, self.mock_build.return_value)
+        self.assertIs(user.taste_profile, rebuilt)
+        self.mock_find_user.assert_called_once_with('user1', 'listening_data')
+        self.mock_expand.assert_called_once_with(self.mock_find_user.return_value.song_data)
+        self.mock_objects.assert_called_once_with(spotify_id='user1')
+        self.mock_objects.return_value.update_one.assert_called_once_with(
+            set__taste_profile=rebuilt)
+
+    def test_signature_from_another_configuration_is_rebuilt(self):
+        now = datetime.utcnow()
+
+        profile.get_profile(self.user(synced=now, built=now, minhash_size=128))
+
+        self.mock_build.assert_called_once()
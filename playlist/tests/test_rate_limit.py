@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+from unittest import TestCase
+import json
+import os
+import tempfile
+
+from playlist.rate_limit import FileTokenBucket, RateLimitError
+from playlist.spotify_client import SpotifyClient, SpotifyError
+
+
+def spotify_response(status_code, headers=None):
+    response = Mock(status_code=status_code, headers=headers or {},
+                    ok=status_code < 400, url='https://api.spotify.com/v1/me')
+    response.json.return_value = {'error': {'status': status_code, 'message': 'nope'}}
+    return response
+
+
+class TestFileTokenBucket(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'bucket.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_burst_then_refuses_beyond_max_wait(self):
+        bucket = FileTokenBucket(self.path, rate=0.01, capacity=3)
+        for _ in range(3):
+            bucket.acquire(max_wait=0)
+
+        with self.assertRaises(RateLimitError):
+            bucket.acquire(max_wait=0)
+
+    def test_concurrent_acquires_share_one_budget(self):
+        bucket = FileTokenBucket(self.path, rate=0.01, capacity=20)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: bucket.acquire(max_wait=0), range(20)))
+
+        with open(self.path) as state_file:
+            self.assertLess(json.load(state_file)['tokens'], 1)
+
+    def test_block_is_shared_through_the_file(self):
+        FileTokenBucket(self.path, rate=10, capacity=10).block_for(60)
+
+        with self.assertRaises(RateLimitError):
+            FileTokenBucket(self.path, rate=10, capacity=10).acquire(max_wait=1)
+
+
+@patch('playlist.spotify_client.time.sleep')
+class TestSpotifyClientRetries(TestCase):
+    def setUp(self):
+        self.rate_limiter = Mock()
+        self.client = SpotifyClient(rate_limiter=self.rate_limiter)
+        self.client.session = Mock()
+
+    def test_retries_after_429_with_retry_after(self, mock_sleep):
+        self.client.session.request.side_effect = [
+            spotify_response(429, {'Retry-After': '2'}), spotify_response(200)]
+
+        response = self.client.get('me', token='token')
+
+        self.assertEqual(response.status_code, 200)
+        self.rate_limiter.block_for.assert_called_once_with(2.0)
+        self.assertEqual(self.rate_limiter.acquire.call_count, 2)
+
+    def test_long_retry_after_is_not_waited_out(self, mock_sleep):
+        self.client.session.request.return_value = spotify_response(
+            429, {'Retry-After': '3600'})
+
+        with self.assertRaises(RateLimitError):
+            self.client.get('me', token='token')
+        self.assertEqual(self.client.session.request.call_count, 1)
+
+    def test_server_errors_are_retried_a_bounded_number_of_times(self, mock_sleep):
+        self.client.session.request.return_value = spotify_response(503)
+
+        with self.assertRaises(SpotifyError):
+            self.client.get('me', token='token')
+        self.assertEqual(self.client.session.request.call_count, self.client.max_retries + 1)
+        self.assertEqual(mock_sleep.call_count, self.client.max_retries)
+
+    def test_server_errors_on_writes_are_not_retried(self, mock_sleep):
+        self.client.session.request.return_value = spotify_response(502)
+
+        with self.assertRaises(SpotifyError):
+            self.client.post('users/user1/playlists', token='token', data='{}')
+        self.assertEqual(self.client.session.request.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    def test_token_refreshes_are_retried(self, mock_sleep):
+        self.client.session.request.side_effect = [spotify_response(503), spotify_response(200)]
+
+        response = self.client.request_token({'grant_type': 'refresh_token'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session.request.call_count, 2)
+
+    def test_authorization_code_exchanges_are_not_retried(self, mock_sleep):
+        self.client.session.request.return_value = spotify_response(503)
+
+        response = self.client.request_token({'grant_type': 'authorization_code'},
+                                             raise_for_status=False)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.session.request.call_count, 1)
+        mock_sleep.assert_not_called()
@@ -10,16 +10,16 @@ class TestRecommendations(TestCase):
 
     @classmethod
     def setup_class(cls):
-        cls.mock_refresh_token_patcher = patch(
-            'playlist.recommendations.refresh_token')
-        cls.mock_get_patcher = patch(
-            'playlist.recommendations.requests.get')
+        cls.mock_get_access_token_patcher = patch(
+            'playlist.recommendations.get_access_token')
+        cls.mock_client_patcher = patch(
+            'playlist.recommendations.get_client')
         cls.mock_get_seeds_patcher = patch(
             'playlist.recommendations.get_seeds')
         cls.mock_get_seed_names_patcher = patch(
             'playlist.recommendations.get_seed_names')
-        cls.mock_refresh_token = cls.mock_refresh_token_patcher.start()
-        cls.mock_get = cls.mock_get_patcher.start()
+        cls.mock_get_access_token = cls.mock_get_access_token_patcher.start()
+        cls.mock_get = cls.mock_client_patcher.start().return_value.get
         cls.mock_get_seeds = cls.mock_get_seeds_patcher.start()
         cls.mock_get_seed_names = cls.mock_get_seed_names_patcher.start()
         cls.intersection = {
@@ -119,14 +119,14 @@ class TestRecommendations(TestCase):
 
     @classmethod
     def teardown_class(cls):
-        cls.mock_get.stop()
-        cls.mock_refresh_token.stop()
-        cls.mock_get_seeds.stop()
-        cls.mock_get_seed_names.stop()
+        cls.mock_client_patcher.stop()
+        cls.mock_get_access_token_patcher.stop()
+        cls.mock_get_seeds_patcher.stop()
+        cls.mock_get_seed_names_patcher.stop()
 
     def test_get_recommendations(self):
 
-        self.mock_refresh_token.return_value = '1234567890'
+        self.mock_get_access_token.return_value = '1234567890'
         self.mock_get_seeds.return_value = self.seeds
         self.mock_get_seed_names.return_value = ["glam rock (genre)",
                                                  "Icona Pop (artist)",
@@ -162,7 +162,7 @@ class TestRecommendations(TestCase):
         self.assertDictEqual(result, recs)
 
     def test_explicit_filter(self):
-        self.mock_refresh_token.return_value = '1234567890'
+        self.mock_get_access_token.return_value = '1234567890'
         self.mock_get_seeds.return_value = self.seeds
         self.mock_get_seed_names.return_value = ["glam rock (genre)",
                                                  "Icona Pop (artist)",
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from unittest import TestCase
+import threading
+import time
+
+from playlist.tokens import TokenManager
+
+
+class TestTokenManager(TestCase):
+    def setUp(self):
+        self.user_patcher = patch('playlist.tokens.User')
+        self.client_patcher = patch('playlist.tokens.get_client')
+        self.mock_user = self.user_patcher.start()
+        self.mock_request_token = self.client_patcher.start().return_value.request_token
+        self.mock_request_token.return_value.json.return_value = {
+            'access_token': 'fresh-token',
+            'expires_in': 3600
+        }
+        self.manager = TokenManager()
+
+    def tearDown(self):
+        self.user_patcher.stop()
+        self.client_patcher.stop()
+
+    def test_cached_token_is_reused_until_expiry(self):
+        self.assertEqual(self.manager.get_token('app'), 'fresh-token')
+        self.assertEqual(self.manager.get_token('app'), 'fresh-token')
+
+        self.assertEqual(self.mock_request_token.call_count, 1)
+        self.mock_user.objects.return_value.update_one.assert_called_once_with(
+            set__sp_access_token='fresh-token')
+
+    def test_token_close_to_expiry_is_refreshed(self):
+        self.manager.remember('app', 'old-token', 30)
+
+        self.assertEqual(self.manager.get_token('app'), 'fresh-token')
+        self.assertEqual(self.mock_request_token.call_count, 1)
+
+    def test_concurrent_refreshes_share_one_request(self):
+        release = threading.Event()
+
+        def slow_token_request(params):
+            release.wait(1)
+            return self.mock_request_token.return_value
+
+        self.mock_request_token.side_effect = slow_token_request
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = [executor.submit(self.manager.get_token, 'app') for _ in range(5)]
+            time.sleep(0.05)
+            release.set()
+
+        self.assertEqual({result.result() for result in results}, {'fresh-token'})
+        self.assertEqual(self.mock_request_token.call_count, 1)
+
+    def test_stale_token_forces_refresh(self):
+        self.manager.remember('app', 'rejected-token', 3600)
+
+        self.assertEqual(self.manager.refresh('app', 'rejected-token'), 'fresh-token')
+        self.assertEqual(self.mock_request_token.call_count, 1)
@@ -0,0 +1,21 @@
+from unittest.mock import Mock
+from unittest import TestCase
+
+from playlist.models import normalize_name
+from playlist.users import encode_cursor, decode_cursor
+
+
+class TestUserSearch(TestCase):
+    def test_names_are_normalized_for_prefix_search(self):
+        self.assertEqual(normalize_name('  Zoë   Ádám '), 'zoe adam')
+        self.assertEqual(normalize_name('STRASSE'), normalize_name('straße'))
+        self.assertEqual(normalize_name(None), '')
+
+    def test_cursor_round_trips(self):
+        cursor = encode_cursor(Mock(name_normalized='zoe adam', spotify_id='u1'))
+
+        self.assertEqual(decode_cursor(cursor), ('zoe adam', 'u1'))
+
+    def test_malformed_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor')
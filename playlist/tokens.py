@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+
+from .models import User
+from .spotify_client import get_client
+
+EXPIRY_MARGIN = 60
+
+
+class TokenManager:
+    def __init__(self, expiry_margin=EXPIRY_MARGIN):
+        self.expiry_margin = expiry_margin
+        self._tokens = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock_for(self, user_id):
+        with self._locks_lock:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _cached(self, user_id):
+        entry = self._tokens.get(user_id)
+        if entry and entry[1] - self.expiry_margin > time.monotonic():
+            return entry[0]
+        return None
+
+    def remember(self, user_id, access_token, expires_in):
+        self._tokens[user_id] = (access_token, time.monotonic() + expires_in)
+
+    def forget(self, user_id):
+        self._tokens.pop(user_id, None)
+
+    def get_token(self, user_id):
+        return self._cached(user_id) or self.refresh(user_id)
+
+    def refresh(self, user_id, stale_token=None):
+        with self._lock_for(user_id):
+            # Whoever held the lock before us may already have refreshed, in
+            # which case their token is handed out instead of a second POST.
+            cached = self._cached(user_id)
+            if cached and cached != stale_token:
+                return cached
+
+            user = User.objects(spotify_id=user_id).only('sp_refresh_token').first()
+            params = {
+                'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
+                'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
+                'grant_type': 'refresh_token',
+                'refresh_token': user.sp_refresh_token
+            }
+            token_info = get_client().request_token(params).json()
+
+            changes = {'set__sp_access_token': token_info['access_token']}
+            if token_info.get('refresh_token'):
+                changes['set__sp_refresh_token'] = token_info['refresh_token']
+            User.objects(spotify_id=user_id).update_one(**changes)
+
+            self.remember(user_id, token_info['access_token'],
+                          token_info.get('expires_in', 3600))
+            return token_info['access_token']
+
+
+token_manager = TokenManager()
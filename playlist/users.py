@@ -0,0 +1,91 @@
+import base64
+import json
+
+from mongoengine import Q
+
+from .models import User, normalize_name
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+
+# Every projection keeps the required fields so partially loaded documents
+# still validate when a handler saves them.
+BASE_FIELDS = ('spotify_id', 'name')
+
+PROJECTIONS = {
+    'identity': (),
+    'profile': ('image_links',),
+    'friends': ('friends',),
+    'playlists': ('playlists',),
+    'sync_state': ('song_data.modified',),
+    'versions': ('song_data.modified', 'friends_modified', 'playlists_modified'),
+    'taste_profile': ('song_data.modified', 'taste_profile'),
+    'top_songs': ('song_data.top_songs',),
+    'listening_data': ('song_data',),
+    'sync': ('sp_access_token', 'sp_refresh_token', 'song_data', 'taste_profile'),
+}
+
+
+def projection_fields(*projections):
+    fields = set(BASE_FIELDS)
+    for projection in projections:
+        fields.update(PROJECTIONS[projection])
+    # Mongo rejects a projection naming both a field and one of its subfields.
+    return {field for field in fields if field.split('.')[0] == field
+            or field.split('.')[0] not in fields}
+
+
+def projections_cover(loaded_projections, projections):
+    loaded = projection_fields(*loaded_projections)
+    return all(field in loaded or field.split('.')[0] in loaded
+               for field in projection_fields(*projections))
+
+
+def find_user(user_id, *projections):
+    if not user_id:
+        return None
+    return User.objects(spotify_id=user_id).only(*projection_fields(*projections)).first()
+
+
+def find_users(user_ids, *projections):
+    return User.objects(spotify_id__in=list(user_ids)).only(
+        *projection_fields(*projections))
+
+
+def encode_cursor(user):
+    position = json.dumps([user.name_normalized, user.spotify_id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        name_normalized, spotify_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(F'invalid cursor {cursor}')
+    return name_normalized, spotify_id
+
+
+def search_users(query=None, exclude=(), limit=SEARCH_PAGE_SIZE, cursor=None):
+    # Pages are ordered by (name_normalized, spotify_id) so every page is a
+    # range scan of the compound index, however deep the cursor goes.
+    limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+    users = User.objects(spotify_id__nin=list(exclude))
+    if query:
+        users = users.filter(name_normalized__startswith=normalize_name(query))
+    if cursor:
+        name_normalized, spotify_id = decode_cursor(cursor)
+        users = users.filter(Q(name_normalized__gt=name_normalized) |
+                             Q(name_normalized=name_normalized, spotify_id__gt=spotify_id))
+
+    page = list(users.order_by('name_normalized', 'spotify_id').only(
+        'name', 'spotify_id', 'name_normalized').limit(limit + 1))
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def backfill_normalized_names():
+    count = 0
+    for user in User.objects(name_normalized=None).only('name'):
+        User.objects(id=user.id).update_one(set__name_normalized=normalize_name(user.name))
+        count += 1
+    return count
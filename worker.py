@@ -0,0 +1,18 @@
+import logging
+import os
+
+from dotenv import load_dotenv
+import mongoengine
+from prometheus_client import start_http_server
+
+from playlist.jobs import run_worker
+from playlist.metrics import MongoCommandListener, metrics_registry
+
+if __name__ == '__main__':
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    mongoengine.connect('flaskapp', host=os.getenv('MONGODB_URI'),
+                        event_listeners=[MongoCommandListener()])
+    if os.getenv('WORKER_METRICS_PORT'):
+        start_http_server(int(os.getenv('WORKER_METRICS_PORT')), registry=metrics_registry())
+    run_worker()